@@ -0,0 +1,119 @@
+"""
+Quick accessibility heuristics for the errors column.
+
+AccessibilityParser is fed a page in chunks as it downloads, so only counters
+and the ids of form fields/labels are kept in memory, never the whole page.
+It counts four common problems:
+
+    missing_alt      <img> without an alt attribute
+    empty_link       <a href> with no text, aria-label, title or image alt
+    missing_lang     <html> without a lang attribute (at most 1 per page)
+    unlabeled_field  form field with no <label>, aria-label, aria-labelledby or title
+
+These are a cheap first pass, not a replacement for a Pope Tech scan.
+"""
+import codecs
+from html.parser import HTMLParser
+
+import requests
+
+MAX_PAGE_BYTES = 2 * 1024 * 1024 # stop reading a page after 2 MB
+CHUNK_SIZE = 16 * 1024
+# input types that are not labelled by the user
+UNLABELED_INPUT_TYPES = {'hidden', 'submit', 'reset', 'button', 'image'}
+
+class AccessibilityParser(HTMLParser):
+    """Streaming HTML parser that counts accessibility problems"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.counts = {'missing_alt': 0, 'empty_link': 0, 'missing_lang': 0, 'unlabeled_field': 0}
+        self.label_depth = 0 # > 0 while inside <label>, which labels the fields it wraps
+        self.label_for = set() # ids named by <label for="...">
+        self.fields_by_id = set() # ids of fields that still need a <label for>
+        self.link_open = False
+        self.link_has_name = False
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'html' and not (attrs.get('lang') or '').strip():
+            self.counts['missing_lang'] = 1
+        elif tag == 'img':
+            if 'alt' not in attrs:
+                self.counts['missing_alt'] += 1
+            elif self.link_open and (attrs.get('alt') or '').strip():
+                self.link_has_name = True # an image with alt text names its link
+        elif tag == 'a' and 'href' in attrs:
+            self.link_open = True
+            self.link_has_name = bool((attrs.get('aria-label') or attrs.get('title') or '').strip())
+        elif tag == 'label':
+            self.label_depth += 1
+            if attrs.get('for'):
+                self.label_for.add(attrs['for'])
+        elif tag in ('input', 'select', 'textarea'):
+            self.check_field(tag, attrs)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag == 'a':
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag == 'a' and self.link_open:
+            if not self.link_has_name:
+                self.counts['empty_link'] += 1
+            self.link_open = False
+        elif tag == 'label' and self.label_depth:
+            self.label_depth -= 1
+
+    def handle_data(self, data):
+        if self.link_open and data.strip():
+            self.link_has_name = True
+
+    def check_field(self, tag, attrs):
+        """Count a field as unlabeled now, or remember its id until all <label for>s are seen"""
+        if tag == 'input' and (attrs.get('type') or 'text').lower() in UNLABELED_INPUT_TYPES:
+            return
+        if self.label_depth or attrs.get('aria-label') or attrs.get('aria-labelledby') or attrs.get('title'):
+            return
+        if attrs.get('id'):
+            self.fields_by_id.add(attrs['id']) # a <label for> may still come later in the page
+        else:
+            self.counts['unlabeled_field'] += 1
+
+    def close(self):
+        super().close()
+        self.counts['unlabeled_field'] += len(self.fields_by_id - self.label_for)
+        self.fields_by_id.clear()
+        return self.counts
+
+def count_accessibility_errors(url, session=None, timeout=10):
+    """
+    Stream a page and return its problem counts by type, or None if it could not be fetched.
+
+    Args:
+        url (str): Page to check; http:// is assumed when the scheme is missing
+        session (requests.Session): Optional session to reuse connections
+        timeout (int): Seconds to wait for the server
+    """
+    if '://' not in url:
+        url = f'http://{url}'
+    getter = session or requests
+    try:
+        with getter.get(url, stream=True, allow_redirects=True, timeout=timeout) as response:
+            if response.status_code != 200:
+                return None
+            decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')(errors='replace')
+            parser = AccessibilityParser()
+            read = 0
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                parser.feed(decoder.decode(chunk))
+                read += len(chunk)
+                if read >= MAX_PAGE_BYTES:
+                    break
+            parser.feed(decoder.decode(b'', final=True))
+            return parser.close()
+    except (requests.RequestException, LookupError, ValueError):
+        # LookupError: unknown charset. ValueError: malformed URL, e.g. an empty
+        # label in the host, which urllib3 raises as LocationParseError
+        return None
@@ -1,11 +1,11 @@
 import psycopg2 # For accessing PostgreSQL server
 import psycopg2.extras
-from flask import Flask, render_template, request, session, redirect, url_for, flash, jsonify
+from flask import Flask, render_template, request, session, redirect, url_for, flash, jsonify, get_template_attribute, has_request_context
+from markupsafe import Markup # Marks cached department fragments as already-escaped HTML
 
 import csv # For pope tech merge 
 import requests # For checking site status
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from urllib.parse import urlparse
 
 #Libraries below are for a locally-executed demo. Use UMN SSO in production
 from werkzeug.security import check_password_hash, generate_password_hash
@@ -17,6 +17,13 @@ import os # stores temporary password locally on user's machine
 import json # key value for timestamp and password
 import tempfile # stores command line password input; not needed in production if SSO is implemented
 import time #for password expiration timestamp
+import uuid # data version tokens for cached departments
+import threading # per-thread HTTP sessions for the accessibility crawler
+
+from cache import make_cache # Department/contact/site data cache shared across workers
+from accessibility import count_accessibility_errors # Streaming accessibility heuristics for the errors column
+from liveness import site_urls, check_urls # Deduplicated checks of every primary/alias URL
+from site_store import SiteStore # Compact columnar rows for wedacs_list
 
 #Local server for demo, not to be used in production
 app = Flask(__name__)
@@ -26,8 +33,17 @@ app.permanent_session_lifetime = timedelta(minutes=5)
 # dbName = "DrupalSitesByDepartment" 
 # dbUser = "postgres"
 # dbPassword = None
-DEPARTMENTS = [] #Initialize array for storing department names and queries
-CONTACTS = [] #WEDAC contacts for each department
+# Department names/queries, WEDAC contacts and rendered department tables are cached here instead of
+# in module globals. Set CACHE_URL to redis://... or sqlite:///... to share one copy between
+# gunicorn workers; otherwise each process keeps its own in-memory LRU
+CACHE = make_cache()
+# Safety net for changes made outside the app (e.g. edits in pgAdmin); write routes invalidate immediately
+CACHE_TTL = int(os.environ.get('CACHE_TTL', 600))
+# Seconds after a write during which reads go to the primary instead of the replica.
+# Should comfortably exceed the replica's replay lag
+READ_YOUR_WRITES_SECONDS = int(os.environ.get('READ_YOUR_WRITES_SECONDS', 10))
+# Catalogue columns written to the CSV exports; row_version is internal to the edit form
+EXPORT_COLUMNS = 'id, title, environments, aliases, owners, primary_url, department, notes, pope_tech, errors, active, cms'
 # File to temporarily store password
 TEMP_PASSWORD_FILE = os.path.join(tempfile.gettempdir(), 'flask_db_password_temp')
 # Password expiration time in seconds (30 minutes)
@@ -102,8 +118,18 @@ def get_db_password():
         # If we get here, password was wrong, so we'll prompt again
         return get_db_password()  # Recursive call to try again
 
-def get_db_connection():
-    """Create and return database connection using the stored password. Host and port will be different in production"""
+def get_db_connection(readonly=False):
+    """
+    Create and return database connection using the stored password. Host and port will be different in production
+
+    Args:
+        readonly (bool): True for code paths that never write. They are sent to the read
+                         replica in DATABASE_READ_URL, when one is configured, unless this
+                         session wrote within the last READ_YOUR_WRITES_SECONDS
+    """
+    read_url = os.environ.get("DATABASE_READ_URL")
+    if readonly and read_url and not session_wrote_recently():
+        return psycopg2.connect(read_url)
     db_url = os.environ.get("DATABASE_URL")
     return psycopg2.connect(db_url)
 
@@ -117,6 +143,42 @@ def get_db_connection():
     #     port="5432"
     # )
 
+def session_wrote_recently():
+    """True if the logged in user committed a write so recently that the replica may not have it yet"""
+    if not has_request_context():
+        return False
+    return time.time() - session.get('last_write_at', 0) < READ_YOUR_WRITES_SECONDS
+
+def get_cache_load_connection():
+    """
+    Connection for loading data into the shared cache. Right after anyone's write
+    this is the primary, so rows a lagging replica has not replayed yet are never
+    cached under the freshly bumped version token.
+    """
+    return get_db_connection(readonly=CACHE.get('recent_write') is None)
+
+def record_write():
+    """
+    Note that a write was just committed: for READ_YOUR_WRITES_SECONDS this session's
+    reads and every cache load go to the primary. Call after CACHE.clear(), which drops the marker.
+    """
+    CACHE.set('recent_write', True, ttl=READ_YOUR_WRITES_SECONDS)
+    if has_request_context():
+        session['last_write_at'] = time.time()
+
+# SQL run by the routes and batch jobs. Module level so check_query_plans.py EXPLAINs
+# the statements that actually ship
+DEPARTMENT_NAMES_SQL = '''
+    SELECT DISTINCT department
+    FROM public.drupal_sites_by_department
+    WHERE department IS NOT NULL
+    ORDER BY drupal_sites_by_department.department
+'''
+DEPARTMENT_ROWS_SQL = '''
+    SELECT id, title, environments, aliases, owners, primary_url, notes, pope_tech, errors, active, cms, row_version
+    FROM public.drupal_sites_by_department WHERE department = %s ORDER BY id
+'''
+
 def populate(DEPARTMENTS):
     """
     Populate the DEPARTMENTS array based on public.drupal_sites_by_department table.
@@ -125,13 +187,9 @@ def populate(DEPARTMENTS):
         DEPARTMENTS (array): Array of dictionaries containing key-value pairs 
         to identify each department in the API calls and html form
     """
-    conn = get_db_connection()
+    conn = get_cache_load_connection()
     cur = conn.cursor()
-    cur.execute('''SELECT DISTINCT department
-            FROM public.drupal_sites_by_department 
-            WHERE department IS NOT NULL
-            ORDER BY drupal_sites_by_department.department
-                ''')
+    cur.execute(DEPARTMENT_NAMES_SQL)
     departments = cur.fetchall()
     department_names = []
     for department in departments:
@@ -164,7 +222,6 @@ def populate(DEPARTMENTS):
                 'id': f'{department_name.split(" ")[0]}View',
                 'title': department_names[index],
                 'name': department_names[index],
-                'query': f"SELECT id, title, environments, aliases, owners, primary_url, notes, pope_tech, errors, active, cms FROM public.drupal_sites_by_department WHERE department = '{department_names[index]}' ORDER BY id"
             })
             index += 1 #increment index for next department in department_names
         except psycopg2.Error as e:
@@ -173,6 +230,12 @@ def populate(DEPARTMENTS):
     print(f"{index} departments populated successfully")
     return None
 
+UPDATE_POPE_TECH_SQL = '''
+    UPDATE public.drupal_sites_by_department
+    SET pope_tech = TRUE
+    WHERE primary_url = %s;
+'''
+
 def update_pope_tech_from_csv(fname):
     """
     Updates the pope_tech column to True for entries in the master table that
@@ -192,15 +255,12 @@ def update_pope_tech_from_csv(fname):
             reader = csv.DictReader(csvfile)
             urls_to_update = [row['Primary URL (Site folder name)'] for row in reader]
 
-        update_query = """
-            UPDATE public.drupal_sites_by_department
-            SET pope_tech = TRUE
-            WHERE primary_url = %s;
-        """
         for url in urls_to_update:
-            cur.execute(update_query, (url,))
+            cur.execute(UPDATE_POPE_TECH_SQL, (url,))
 
         conn.commit()
+        CACHE.clear() # pope_tech may have changed in any department
+        record_write()
 
         print(f"Successfully updated pope_tech to True for {len(urls_to_update)} entries.")
 
@@ -218,6 +278,8 @@ def update_pope_tech_from_csv(fname):
         if conn:
             conn.close()
 
+CONTACTS_SQL = 'SELECT * FROM public.wedac_contacts ORDER BY id'
+
 def populate_contacts(CONTACTS):
     """
     Populate contacts table for each department based on
@@ -225,10 +287,10 @@ def populate_contacts(CONTACTS):
     Args:
         CONTACTS (array): Array of dictionaries containing key-value pairs of departments and WEDAC contact info
     """
-    conn = get_db_connection()
+    conn = get_cache_load_connection()
     # Use DictCursor to get dict results
     cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-    cur.execute('SELECT * FROM public.wedac_contacts ORDER BY id')
+    cur.execute(CONTACTS_SQL)
     contacts = cur.fetchall()
     conn.commit()
     # print(f"First check (raw data): {contacts}")
@@ -250,28 +312,198 @@ def populate_contacts(CONTACTS):
     conn.close()
     return None
 
-def is_url_active(url):
-    """Check if URL is reachable with proper scheme handling"""
-    try:
-        # Add scheme if missing
-        parsed = urlparse(url)
-        if not parsed.scheme:
-            url = f"http://{url}"
-            
-        response = requests.head(url, allow_redirects=True, timeout=10)
-        if response.status_code == 200:
-            return True
-            
-        # Fallback to GET for servers that reject HEAD
-        response = requests.get(url, allow_redirects=True, timeout=10)
-        return response.status_code == 200
-    except Exception:
-        return False
+def get_departments():
+    """Return the department list from the cache, loading it with populate() on a miss"""
+    departments = CACHE.get('departments')
+    if departments is None:
+        departments = []
+        populate(departments)
+        CACHE.set('departments', departments, ttl=CACHE_TTL)
+    return departments
 
-def mark_inactive_sites():
+def get_contacts():
+    """Return the WEDAC contact list from the cache, loading it with populate_contacts() on a miss"""
+    contacts = CACHE.get('contacts')
+    if contacts is None:
+        contacts = []
+        populate_contacts(contacts)
+        CACHE.set('contacts', contacts, ttl=CACHE_TTL)
+    return contacts
+
+def get_department_versions(departments):
+    """
+    Return {department title: data version token}, creating tokens the cache
+    does not have. Rendered fragments are keyed by this token, so bumping it in
+    invalidate_cache() retires them in every worker at once.
+
+    Args:
+        departments (array): Department dictionaries built by populate()
     """
-    Check sites with pope_tech=False and log inactive ones to CSV using
-    up to 20 parallel threads for efficiency
+    keys = [f"version:{department['title']}" for department in departments]
+    versions = {}
+    for department, version in zip(departments, CACHE.get_many(keys)): # one round trip for every department
+        if version is None:
+            version = uuid.uuid4().hex
+            CACHE.set(f"version:{department['title']}", version)
+        versions[department['title']] = version
+    return versions
+
+def get_table_data(departments):
+    """
+    Return {department title: rows} for the given departments. Only called for
+    departments whose fragment has to be re-rendered, so the rows are not cached
+    themselves; the fragment is.
+
+    Args:
+        departments (array): Department dictionaries built by populate()
+    """
+    dept_data = {}
+    conn = get_cache_load_connection()
+    cur = conn.cursor()
+    for department in departments:
+        cur.execute(DEPARTMENT_ROWS_SQL, (department['title'],))
+        dept_data[department['title']] = cur.fetchall()
+    cur.close()
+    conn.close()
+    return dept_data
+
+def render_department_fragments(departments, contacts):
+    """
+    Return the rendered render_table() HTML for every department, re-rendering
+    only departments whose data version changed since their fragment was cached.
+
+    Args:
+        departments (array): Department dictionaries built by populate()
+        contacts (array): WEDAC contact dictionaries built by populate_contacts()
+    """
+    versions = get_department_versions(departments)
+    keys = [f"fragment:{department['title']}:{versions[department['title']]}" for department in departments]
+    fragments = {}
+    stale = []
+    for department, key, fragment in zip(departments, keys, CACHE.get_many(keys)):
+        if fragment is None:
+            stale.append((department, key))
+        else:
+            fragments[department['title']] = fragment
+
+    if stale:
+        render_table = get_template_attribute('macros.html', 'render_table')
+        dept_data = get_table_data([department for department, key in stale])
+        for department, key in stale:
+            fragment = str(render_table(department['id'], department['title'], dept_data[department['title']], contacts))
+            CACHE.set(key, fragment, ttl=CACHE_TTL)
+            fragments[department['title']] = fragment
+    # Fragments were escaped when the macro rendered them, so they are marked safe for index.html
+    return [Markup(fragments[department['title']]) for department in departments]
+
+def invalidate_cache(departments=(), contacts=False):
+    """
+    Retire cached data after a write has been committed. With a shared backend
+    this is seen by every worker on its next request.
+
+    Args:
+        departments (iterable): Departments whose rows or contacts changed. Their version is
+                                bumped so their fragments re-render, and the department
+                                list is reloaded too, since a move or delete can empty one
+        contacts (bool): True if wedac_contacts changed
+    """
+    record_write()
+    keys = []
+    if departments:
+        keys.append('departments')
+        for department in departments:
+            if department:
+                CACHE.set(f'version:{department}', uuid.uuid4().hex)
+    if contacts:
+        keys.append('contacts')
+    CACHE.delete(*keys)
+
+def record_site_event(cur, site_id, event_type, department, target_department=None, changes=None):
+    """
+    Append one row to site_events using the caller's cursor, so the event is
+    committed or rolled back together with the change it describes.
+
+    Args:
+        cur: Open cursor inside the caller's transaction
+        site_id (int): id of the drupal_sites_by_department row
+        event_type (str): 'move' or 'update'
+        department (str): Department the site was in when the event happened
+        target_department (str): Destination department for moves
+        changes (dict): Column -> new value for updates
+    """
+    cur.execute('''
+        INSERT INTO public.site_events (site_id, event_type, department, target_department, changes, username)
+        VALUES (%s, %s, %s, %s, %s, %s)
+    ''', (site_id, event_type, department, target_department,
+          psycopg2.extras.Json(changes) if changes is not None else None, session.get('username')))
+
+SITE_HISTORY_SQL = '''
+    SELECT * FROM public.site_events
+    WHERE site_id = %s
+    ORDER BY created_at DESC
+    LIMIT %s
+'''
+# UNION of two index scans rather than an OR, so each side uses its own index
+DEPARTMENT_HISTORY_SQL = '''
+    (SELECT * FROM public.site_events WHERE department = %s ORDER BY created_at DESC LIMIT %s)
+    UNION
+    (SELECT * FROM public.site_events WHERE target_department = %s ORDER BY created_at DESC LIMIT %s)
+    ORDER BY created_at DESC
+    LIMIT %s
+'''
+
+def get_site_history(site_id, limit=100):
+    """Return the newest site_events rows for one site as a list of dicts"""
+    conn = get_db_connection(readonly=True)
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    cur.execute(SITE_HISTORY_SQL, (site_id, limit))
+    events = cur.fetchall()
+    cur.close()
+    conn.close()
+    return events
+
+def get_department_history(department, limit=100):
+    """Return the newest site_events rows that happened in or moved sites into a department"""
+    conn = get_db_connection(readonly=True)
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    cur.execute(DEPARTMENT_HISTORY_SQL, (department, limit, department, limit, limit))
+    events = cur.fetchall()
+    cur.close()
+    conn.close()
+    return events
+
+UNCHECKED_SITES_SQL = f'''
+    SELECT {EXPORT_COLUMNS} FROM public.drupal_sites_by_department
+    WHERE pope_tech = FALSE
+      AND (primary_url IS NOT NULL OR aliases IS NOT NULL)
+'''
+DELETE_URL_CHECKS_SQL = 'DELETE FROM public.site_url_checks WHERE site_id = ANY(%s)'
+INSERT_URL_CHECKS_SQL = '''
+    INSERT INTO public.site_url_checks (site_id, url, kind, is_up, status_code, error, elapsed_ms)
+    VALUES %s
+'''
+UPDATE_ACTIVE_SQL = '''
+    UPDATE public.drupal_sites_by_department AS sites
+    SET active = data.active
+    FROM (VALUES %s) AS data (id, active)
+    WHERE sites.id = data.id
+'''
+BROKEN_ALIASES_SQL = '''
+    SELECT sites.id, sites.title, sites.department, checks.url, checks.kind, checks.status_code, checks.error
+    FROM public.site_url_checks AS checks
+    JOIN public.drupal_sites_by_department AS sites ON sites.id = checks.site_id
+    WHERE NOT checks.is_up AND checks.kind <> 'primary'
+    ORDER BY sites.department, sites.id, checks.url
+'''
+
+def mark_inactive_sites(max_workers=50):
+    """
+    Check every URL of the sites with pope_tech=False (primary_url and all
+    aliases, see liveness.py) in one pass, store each URL's result in
+    site_url_checks and roll them up into the site's active flag: a site is
+    active while any of its production URLs (primary_url and aliases that are
+    not dev/stg hosts) answers 200. Active and inactive sites are written to
+    CSV, and every broken alias or dev/stg host to broken_aliases.csv.
 
     Update 5/2: Write sites with pope_tech=False to a separate CSV using 
     reversed logic
@@ -280,49 +512,49 @@ def mark_inactive_sites():
     cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
 
     # Fetch columns for CSV header
-    cur.execute('''
-    SELECT * FROM public.drupal_sites_by_department 
-    WHERE pope_tech = FALSE 
-      AND primary_url IS NOT NULL
-      ''')
+    cur.execute(UNCHECKED_SITES_SQL)
     rows = cur.fetchall()
+    conn.commit() # don't sit idle in a transaction while the URLs are checked
     columns = [desc[0] for desc in cur.description]
 
-    # Parallel URL checking
-    inactive_rows = []
-    active_rows = []
-    with ThreadPoolExecutor(max_workers=20) as executor:
-        futures = {executor.submit(is_url_active, row['primary_url']): row for row in rows}
-        
-        for future in as_completed(futures):
-            row = futures[future]
-            if not future.result():
-                inactive_rows.append(row) #site is inactive
-            else:
-                active_rows.append(row) #site is active
+    # Expand every site into its URLs; check_urls() requests each distinct URL once
+    urls_by_site = {row['id']: site_urls(row['primary_url'], row['aliases'], row['environments']) for row in rows}
+    statuses = check_urls([url for urls in urls_by_site.values() for url, kind in urls], max_workers)
+
+    # A live dev/stg host does not mean the production site is up, so environments don't count
+    is_active = {site_id: any(statuses[url].is_up for url, kind in urls if kind != 'environment')
+                 for site_id, urls in urls_by_site.items()}
+    active_rows = [row for row in rows if is_active[row['id']]] #site is active
+    inactive_rows = [row for row in rows if not is_active[row['id']]] #site is inactive
+
+    # Replace the stored URL results of the checked sites, so removed aliases drop out
+    checked_ids = list(urls_by_site)
+    cur.execute(DELETE_URL_CHECKS_SQL, (checked_ids,))
+    psycopg2.extras.execute_values(cur, INSERT_URL_CHECKS_SQL, [(site_id, url, kind, *statuses[url]) for site_id, urls in urls_by_site.items() for url, kind in urls],
+        page_size=1000)
+    # Only touch rows whose flag actually changes
+    changed = [(row['id'], is_active[row['id']]) for row in rows if row['active'] != is_active[row['id']]]
+    psycopg2.extras.execute_values(cur, UPDATE_ACTIVE_SQL, changed, page_size=1000)
+    conn.commit()
+    if changed:
+        CACHE.clear() # active may have changed in any department
+        record_write()
 
-    # Update database and write CSV
+    # Broken aliases don't change active, so they are reported on their own
+    cur.execute(BROKEN_ALIASES_SQL)
+    broken_aliases = cur.fetchall()
+    broken_columns = [desc[0] for desc in cur.description]
+    conn.commit()
+
+    # Write CSVs
     if inactive_rows:
         with open('inactive_sites.csv', 'w', newline='') as csvfile:
             writer = csv.DictWriter(csvfile, fieldnames=columns)
             writer.writeheader()
             
             for row in inactive_rows:
-                # Update notes field
-                active = row['active'] or ''
-                if active == True: #Default is true, must update column to reflect inactive site
-                    new_active = False
-                    cur.execute('''
-                        UPDATE public.drupal_sites_by_department
-                        SET active = %s
-                        WHERE id = %s
-                    ''', (new_active, row['id']))
-                
-                # Write to CSV
                 writer.writerow(dict(row))
                 print(f'{row['title']} flagged as inactive')
-                
-        conn.commit()
     if active_rows:
         with open('active_sites.csv', 'w', newline='') as csvfile:
             writer = csv.DictWriter(csvfile, fieldnames=columns)
@@ -331,14 +563,90 @@ def mark_inactive_sites():
             for row in active_rows:
                 writer.writerow(dict(row))
                 print(f'{row['title']} flagged as active')
-    print(f"Checked {len(rows)} URLs, found {len(inactive_rows)} inactive")
-    print(f"Checked {len(rows)} URLs, found {len(active_rows)} active")
+    if broken_aliases:
+        with open('broken_aliases.csv', 'w', newline='') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(broken_columns)
+            writer.writerows(broken_aliases)
+    down = sum(1 for status in statuses.values() if not status.is_up)
+    print(f"Checked {len(statuses)} URLs of {len(rows)} sites, {down} URLs down")
+    print(f"Found {len(broken_aliases)} broken aliases and dev/stg hosts")
+    print(f"Checked {len(rows)} sites, found {len(inactive_rows)} inactive")
+    print(f"Checked {len(rows)} sites, found {len(active_rows)} active")
     cur.close()
     conn.close()
 
-def wedacs_list():
-    """Create WEDACS folders with department CSV files"""
+ACTIVE_SITES_SQL = '''
+    SELECT id, primary_url FROM public.drupal_sites_by_department
+    WHERE active = TRUE AND primary_url IS NOT NULL
+'''
+UPDATE_ERRORS_SQL = '''
+    UPDATE public.drupal_sites_by_department AS sites
+    SET errors = data.errors
+    FROM (VALUES %s) AS data (id, errors)
+    WHERE sites.id = data.id
+      AND sites.errors IS DISTINCT FROM data.errors -- unchanged rows would still bump row_version
+'''
+
+def update_accessibility_errors(max_workers=20, batch_size=100):
+    """
+    Crawl every active site's primary_url with up to max_workers parallel threads,
+    count quick accessibility problems (see accessibility.py) and write the totals
+    to the errors column, batch_size rows per UPDATE. Sites that cannot be fetched
+    keep their current errors value, and unchanged totals are not rewritten.
+    """
     conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute(ACTIVE_SITES_SQL)
+    sites = cur.fetchall()
+    conn.commit() # don't sit idle in a transaction while the crawl runs
+
+    # One session per worker thread so connections to the same host are reused
+    local = threading.local()
+    def check(url):
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        return count_accessibility_errors(url, local.session)
+
+    def write_batch(batch):
+        psycopg2.extras.execute_values(cur, UPDATE_ERRORS_SQL, batch)
+        conn.commit()
+
+    batch = []
+    checked = 0 # sites crawled; every one of them is written by a batch
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(check, url): site_id for site_id, url in sites}
+        for future in as_completed(futures):
+            counts = future.result()
+            if counts is None:
+                continue # unreachable; mark_inactive_sites deals with those
+            batch.append((futures[future], sum(counts.values())))
+            checked += 1
+            if len(batch) >= batch_size:
+                write_batch(batch)
+                batch = []
+    if batch:
+        write_batch(batch)
+
+    if checked:
+        CACHE.clear() # errors may have changed in any department
+        record_write()
+    print(f"Counted accessibility errors for {checked} of {len(sites)} active sites")
+    cur.close()
+    conn.close()
+
+WEDAC_DEPARTMENTS_SQL = '''
+    SELECT DISTINCT department
+    FROM public.wedac_contacts
+    WHERE department IS NOT NULL
+    ORDER BY department
+'''
+CONTACTS_BY_DEPARTMENT_SQL = 'SELECT * FROM public.wedac_contacts ORDER BY department, id'
+SITES_BY_DEPARTMENT_SQL = f'SELECT {EXPORT_COLUMNS} FROM public.drupal_sites_by_department ORDER BY department, title, id'
+
+def wedacs_list():
+    """Create WEDACS folders with department CSV files. Reads from the replica when one is configured"""
+    conn = get_db_connection(readonly=True)
     cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
 
     # Create main WEDACS folder
@@ -346,82 +654,51 @@ def wedacs_list():
     os.makedirs(main_folder, exist_ok=True)
 
     # Get departments with WEDAC contacts
-    cur.execute('''
-        SELECT DISTINCT department 
-        FROM public.wedac_contacts
-        WHERE department IS NOT NULL
-        ORDER BY department
-    ''')
+    cur.execute(WEDAC_DEPARTMENTS_SQL)
     departments = [row['department'] for row in cur.fetchall()]
 
+    # Load the catalogue and contacts once and split them per department in memory,
+    # instead of five queries per department. ORDER BY title keeps the database's
+    # collation order for the per-department lists
+    cur.execute(CONTACTS_BY_DEPARTMENT_SQL)
+    contact_columns = [desc[0] for desc in cur.description]
+    contacts_by_department = {}
+    for contact in cur.fetchall():
+        contacts_by_department.setdefault(contact['department'], []).append(tuple(contact))
+    cur.execute(SITES_BY_DEPARTMENT_SQL)
+    sites = SiteStore.from_cursor(cur)
+    id_column = sites.columns.index('id')
+
+    def write_csv(path, columns, rows):
+        with open(path, 'w', newline='') as f:
+            if rows:
+                writer = csv.writer(f)
+                writer.writerow(columns)
+                writer.writerows(rows)
+
     for department in departments:
         # Create department folder
         dept_folder = os.path.join(main_folder, department.strip().replace('/', '_'))
         os.makedirs(dept_folder, exist_ok=True)
 
         # Write WEDAC contacts
-        cur.execute('''
-            SELECT *
-            FROM public.wedac_contacts
-            WHERE department = %s
-        ''', (department,))
-
-        wedac_path = os.path.join(dept_folder, 'wedac_contacts.csv')
-        with open(wedac_path, 'w', newline='') as f:
-            if cur.rowcount > 0:
-                writer = csv.DictWriter(f, fieldnames=[desc[0] for desc in cur.description])
-                writer.writeheader()
-                writer.writerows([dict(row) for row in cur.fetchall()])
-        
+        write_csv(os.path.join(dept_folder, 'wedac_contacts.csv'), contact_columns,
+                  contacts_by_department.get(department, []))
+
         # Write pope tech true sites
-        cur.execute('''
-            SELECT * 
-            FROM public.drupal_sites_by_department 
-            WHERE department = %s AND pope_tech = TRUE
-            ORDER BY title
-        ''', (department,))
-
-        pope_rows = cur.fetchall()
+        pope_rows = sites.select(department=department, pope_tech=True)
         pope_count = len(pope_rows)
-        pope_true_path = os.path.join(dept_folder, 'pope_tech_true_sites.csv')
-        with open(pope_true_path, 'w', newline='') as f:
-            if pope_rows:
-                writer = csv.DictWriter(f, fieldnames=[desc[0] for desc in cur.description])
-                writer.writeheader()
-                writer.writerows([dict(row) for row in pope_rows])
+        write_csv(os.path.join(dept_folder, 'pope_tech_true_sites.csv'), sites.columns, sites.rows(pope_rows))
         # Write Pope Tech False active sites
-        cur.execute('''
-            SELECT * 
-            FROM public.drupal_sites_by_department 
-            WHERE department = %s AND pope_tech = FALSE
-            AND active = true
-            ORDER BY title
-        ''', (department,))
-        
-        active_not_pope_rows = cur.fetchall()
+        active_not_pope_rows = sites.select(department=department, pope_tech=False, active=True)
         active_not_pope_count = len(active_not_pope_rows)
-        active_not_pope_path = os.path.join(dept_folder, 'active_not_in_pope_tech_sites.csv')
-        with open(active_not_pope_path, 'w', newline='') as f:
-            if active_not_pope_rows:
-                writer = csv.DictWriter(f, fieldnames=[desc[0] for desc in cur.description])
-                writer.writeheader()
-                writer.writerows([dict(row) for row in active_not_pope_rows])
+        write_csv(os.path.join(dept_folder, 'active_not_in_pope_tech_sites.csv'), sites.columns,
+                  sites.rows(active_not_pope_rows))
         # Write Pope Tech False inactive sites
-        cur.execute('''
-            SELECT * 
-            FROM public.drupal_sites_by_department 
-            WHERE department = %s AND pope_tech = FALSE
-            AND active = false
-            ORDER BY title
-        ''', (department,))
-        inactive_not_pope_rows = cur.fetchall()
+        inactive_not_pope_rows = sites.select(department=department, pope_tech=False, active=False)
         inactive_not_pope_count = len(inactive_not_pope_rows)
-        inactive_not_pope_path = os.path.join(dept_folder, 'inactive_not_in_pope_tech_sites.csv')
-        with open(inactive_not_pope_path, 'w', newline='') as f:
-            if inactive_not_pope_rows:
-                writer = csv.DictWriter(f, fieldnames=[desc[0] for desc in cur.description])
-                writer.writeheader()
-                writer.writerows([dict(row) for row in inactive_not_pope_rows])
+        write_csv(os.path.join(dept_folder, 'inactive_not_in_pope_tech_sites.csv'), sites.columns,
+                  sites.rows(inactive_not_pope_rows))
         
         # Write to site counter file 
         total = pope_count + active_not_pope_count + inactive_not_pope_count
@@ -434,19 +711,9 @@ def wedacs_list():
             f.write(f'Inactive sites not in Pope Tech: {inactive_not_pope_count}\n')
 
         # Write to Google Sites file
-        cur.execute('''
-            SELECT * 
-            FROM public.drupal_sites_by_department 
-            WHERE department = %s AND cms = 'Google Sites'
-            ORDER BY id
-        ''', (department,))
-        google_site_rows = cur.fetchall()
-        google_site_path = os.path.join(dept_folder, 'google_sites.csv')
-        with open(google_site_path, 'w', newline='') as f:
-            if google_site_rows:
-                writer = csv.DictWriter(f, fieldnames=[desc[0] for desc in cur.description])
-                writer.writeheader()
-                writer.writerows([dict(row) for row in google_site_rows])
+        google_site_rows = sites.rows(sites.select(department=department, cms='Google Sites'))
+        google_site_rows.sort(key=lambda row: row[id_column]) # by id, like the other exports' ORDER BY id
+        write_csv(os.path.join(dept_folder, 'google_sites.csv'), sites.columns, google_site_rows)
     cur.close()
     conn.close()
     
@@ -457,9 +724,7 @@ def login_required(f):
             # Render the main page with is_authenticated=False
             return render_template(
                 'index.html',
-                tables=[],
-                table_data={},
-                contacts=[],
+                fragments=[],
                 is_authenticated=False
             )
         return f(*args, **kwargs)
@@ -500,29 +765,16 @@ def index():
     """Route to load server data onto page. All data is loaded to allow for efficient client-side
     search and filtering"""
 
-    # Ensure DEPARTMENTS and CONTACTS are populated
-    if not DEPARTMENTS:
-        populate(DEPARTMENTS)
-    
-    if not CONTACTS:
-        populate_contacts(CONTACTS)
-
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)  # Use DictCursor for easier template use
-
-    dept_data = {}
-    for department in DEPARTMENTS:
-        cur.execute(department['query'])
-        dept_data[department['title']] = cur.fetchall()
+    # Departments, contacts and rendered department tables come from the cache; only
+    # departments changed since the last render are queried and re-rendered
+    departments = get_departments()
+    contacts = get_contacts()
+    fragments = render_department_fragments(departments, contacts)
 
-    cur.close()
-    conn.close()
-    # print(f"Final check (CONTACTS list of dicts): {CONTACTS}")
+    # print(f"Final check (contacts list of dicts): {contacts}")
     return render_template(
         'index.html',
-        tables=DEPARTMENTS,
-        table_data=dept_data,
-        contacts=CONTACTS,
+        fragments=fragments,
         is_authenticated=True
     )
 
@@ -547,8 +799,8 @@ def create():
             errors = None #Null inputs must be passed as null rather than empty text
     active = request.form.get('active')
     cms = request.form.get('cms')
-    # Find the correct table information from the DEPARTMENTS dictionary
-    table_info = next((table for table in DEPARTMENTS if table['id'] == table_name), None)
+    # Find the correct table information from the cached department list
+    table_info = next((table for table in get_departments() if table['id'] == table_name), None)
 
     if table_info:
         #department = table_info['title'] #This is the formatted name
@@ -570,6 +822,7 @@ def create():
         # commit the changes
         cur.execute(create_sql, form_values)
         conn.commit()
+        invalidate_cache([department])
 
     # close the cursor and connection
     cur.close()
@@ -577,13 +830,34 @@ def create():
   
     return redirect(url_for('index'))
 
+# Columns the edit form can change, and how /update parses each one
+EDIT_FIELD_TYPES = {
+    'title': 'text',
+    'environments': 'text',
+    'aliases': 'text',
+    'owners': 'text',
+    'primary_url': 'text',
+    'notes': 'text',
+    'pope_tech': 'boolean',
+    'errors': 'integer',
+    'active': 'boolean',
+    'cms': 'text'
+}
+EDIT_COLUMNS = ', '.join(f'"{key}"' for key in EDIT_FIELD_TYPES)
+# Locks the row so the version check and the write see the same data
+LOCK_SITE_SQL = f'''SELECT {EDIT_COLUMNS}, department, row_version::text FROM public."drupal_sites_by_department" WHERE id = %s FOR UPDATE'''
+
 @app.route('/update', methods=['POST'])
 def update():
     """
-    Route to update one or more fields of an instance. 
+    Route to update one or more fields of an instance. Only columns that differ
+    from the stored row are written, and nothing is written if none differ.
 
     Constraints:
         Only one row can be updated at a time.
+        The form's row_version must match the row's current row_version; otherwise
+        someone else saved the row first and the edit is rejected with a 409.
+        An edit without a row_version cannot be checked and is rejected too.
     """  
     conn = get_db_connection()
     cur = conn.cursor()
@@ -593,8 +867,8 @@ def update():
         table_name = request.form['table_name']
         id_value = request.form['id']
 
-        # Find the correct table information from the VIEWS dictionary
-        table_info = next((table for table in DEPARTMENTS if table['id'] == table_name), None)
+        # Find the correct table information from the cached department list
+        table_info = next((table for table in get_departments() if table['id'] == table_name), None)
 
         if not table_info:
             flash(f"{table_name} not found", 'error')
@@ -610,34 +884,53 @@ def update():
                     return int(value) if value else None
                 except (ValueError, TypeError):
                     return None
+
+            if field_type == 'boolean':
+                return value.strip().lower() == 'true' # select options post 'true'/'false'
             
             return value.strip() if value else None
+        
+        # Lock the current row so the version check and the write see the same data
+        cur.execute(LOCK_SITE_SQL, (id_value,))
+        current = cur.fetchone()
+
+        if not current:
+            flash(f"Entry with ID {id_value} not found", 'error')
+            return redirect(url_for('index'))
+
+        *stored_values, department, current_version = current
+        current_values = dict(zip(EDIT_FIELD_TYPES, stored_values))
+        row_version = request.form.get('row_version')
+        if row_version != current_version:
+            conn.rollback()
+            # The row may have changed outside the app's write routes (pgAdmin, a batch job in
+            # another process), leaving the cached fragment with the old version. Re-render it,
+            # so the reload this message asks for shows the current row
+            invalidate_cache([department])
+            if row_version:
+                message = f"{current_values['title']} was changed by someone else. Reload the page and try again."
+            else:
+                message = f"{current_values['title']} could not be checked for other changes. Reload the page and try again."
+            if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+                return jsonify({'success': False, 'message': message}), 409
+            flash(message, 'error')
+            return index(), 409
 
-        # Construct the SET part of the SQL query with proper null handling
+        # Construct the SET part of the SQL query from the columns that actually changed
         update_fields = []
         values = []
+        changes = {} # column -> new value, recorded in site_events
         
-        # Define field types for proper handling
-        field_types = {
-            'title': 'text',
-            'environments': 'text',
-            'aliases': 'text',
-            'owners': 'text',
-            'primary_url': 'text',
-            'notes': 'text',
-            'pope_tech': 'boolean',
-            'errors': 'integer',
-            'active': 'boolean',
-            'cms': 'text'
-        }
-        
-        for key, value in request.form.items():
-            if key not in ['table_name', 'id']:  # Exclude table_name and id from update
-                field_type = field_types.get(key, 'text')
-                processed_value = handle_null_value(value, field_type)
-                
-                update_fields.append(f'"{key}" = %s')
-                values.append(processed_value)
+        for key, field_type in EDIT_FIELD_TYPES.items():
+            if key not in request.form:
+                continue
+            processed_value = handle_null_value(request.form[key], field_type)
+            if processed_value == current_values[key]:
+                continue # unchanged columns are not rewritten
+            
+            update_fields.append(f'"{key}" = %s')
+            values.append(processed_value)
+            changes[key] = processed_value
 
         if update_fields:
             update_fields_str = ', '.join(update_fields)
@@ -645,9 +938,14 @@ def update():
             values.append(id_value)  # Add ID value to the end
             
             cur.execute(query, values)
+            record_site_event(cur, id_value, 'update', department, changes=changes)
             conn.commit()
+            # The row's own department, not table_info: department ids are built from the first
+            # word of the name, so two departments can share one (UniversityView)
+            invalidate_cache([department])
         else:
-            flash("No fields to update", 'warning')
+            conn.rollback() # release the row lock; nothing to write
+            flash("No changes to save", 'warning')
 
     except psycopg2.Error as e:
         conn.rollback()
@@ -669,10 +967,13 @@ def delete():
     # Get the data from the form 
     id_value = request.form['id_value']
 
-    delete_sql = f'''DELETE FROM public."drupal_sites_by_department" WHERE id = %s'''
+    delete_sql = f'''DELETE FROM public."drupal_sites_by_department" WHERE id = %s RETURNING department'''
     cur.execute(delete_sql, (id_value,))
+    deleted = cur.fetchone()
     # commit the changes 
     conn.commit() 
+    if deleted:
+        invalidate_cache([deleted[0]])
   
     # close the cursor and connection 
     cur.close() 
@@ -700,35 +1001,40 @@ def move():
         
     source_department = result[0]  # Get the department value from the result
     
-    # Get current date for the note
-    from datetime import datetime
-    current_date = datetime.now().strftime("%Y-%m-%d")
-    
-    # Create the note text
-    note_text = f"Moved from {source_department} on {current_date}"
-    
-    # Update both department and notes in a single query
+    # Record the move in site_events instead of appending to notes, so row width stays stable
     move_sql = '''
         UPDATE public."drupal_sites_by_department" 
-        SET 
-            department = %s,
-            notes = CASE 
-                WHEN notes IS NULL OR notes = 'None' OR notes = '' THEN %s
-                ELSE notes || '; ' || %s
-            END
+        SET department = %s
         WHERE id = %s
     '''
     
-    # Execute the update
-    cur.execute(move_sql, (target_department, note_text, note_text, id_value))
+    # Execute the update and audit insert in the same transaction
+    cur.execute(move_sql, (target_department, id_value))
+    record_site_event(cur, id_value, 'move', source_department, target_department=target_department)
     
     # Commit the changes
     conn.commit()
+    invalidate_cache([source_department, target_department])
     cur.close()
     conn.close()
     
     return redirect(url_for('index'))
 
+# Moves the sites and logs one move event per moved site in a single statement, so a
+# site added to the source department concurrently is either moved and logged or neither.
+# The insert's row count is the number of sites moved
+MOVE_ALL_SQL = '''
+    WITH moved AS (
+        UPDATE public."drupal_sites_by_department"
+        SET department = %s
+        WHERE department = %s
+        RETURNING id
+    )
+    INSERT INTO public.site_events (site_id, event_type, department, target_department, username)
+    SELECT id, 'move', %s, %s, %s
+    FROM moved
+'''
+
 @app.route('/move-all', methods=['POST'])
 def move_all():
     """Route to move all entries from one department to another"""
@@ -741,38 +1047,20 @@ def move_all():
         target_department = request.form['target_department']
         print(f'Source: {source_department}')
         print(f'Target: {target_department}')
-        # Get current date for the note
-        from datetime import datetime
-        current_date = datetime.now().strftime("%Y-%m-%d")
         
-        # Count how many rows will be affected
-        count_sql = '''SELECT COUNT(*) FROM public."drupal_sites_by_department" WHERE department = %s'''
-        cur.execute(count_sql, (source_department,))
-        affected_rows = cur.fetchone()[0]
+        cur.execute(MOVE_ALL_SQL, (target_department, source_department,
+                                   source_department, target_department, session.get('username')))
+        affected_rows = cur.rowcount
         print(affected_rows)
         if affected_rows > 0:
-            # Update the department field and add a note for all rows in the source department
-            move_all_sql = '''
-                UPDATE public."drupal_sites_by_department" 
-                SET 
-                    department = %s,
-                    notes = CASE 
-                        WHEN notes IS NULL OR notes = 'None' THEN %s
-                        ELSE notes || '; ' || %s
-                    END
-                WHERE department = %s
-            '''
-            
-            # Create the note text
-            note_text = f"Moved from {source_department} on {current_date}"
-            
-            # Execute the update
-            cur.execute(move_all_sql, (target_department, note_text, note_text, source_department))
-            
             # Commit the changes
             conn.commit()
+            invalidate_cache([source_department, target_department])
 
             message = f"Successfully moved {affected_rows} entries from {source_department} to {target_department}"
+        else:
+            conn.rollback()
+            message = f"No entries found in {source_department}"
         # Close the cursor and connection
         cur.close()
         conn.close()
@@ -810,6 +1098,18 @@ def move_all():
             flash(error_message, 'error')
             return redirect(url_for('index'))
     
+@app.route('/history/site/<int:site_id>')
+@login_required
+def site_history(site_id):
+    """Route to return the move/edit history of one site as JSON"""
+    return jsonify(get_site_history(site_id))
+
+@app.route('/history/department/<path:department>')
+@login_required
+def department_history(department):
+    """Route to return the move/edit history of one department as JSON"""
+    return jsonify(get_department_history(department))
+
 @app.route('/contact/create', methods=['POST'])
 def create_contact():
     """Route to add a new contact to the database"""
@@ -834,6 +1134,7 @@ def create_contact():
         '''
         cur.execute(insert_sql, (department, name, email, site))
         conn.commit()
+        invalidate_cache([department], contacts=True)
         
         flash(f'Contact {name} added successfully to {department}', 'success')
         
@@ -865,6 +1166,10 @@ def update_contact():
         if not site or site.strip() == '':
             site = None
             
+        # Both the old and new department tables show this contact, so both are re-rendered
+        cur.execute('''SELECT department FROM public."wedac_contacts" WHERE id = %s''', (contact_id,))
+        previous = cur.fetchone()
+
         # Update the contact
         update_sql = '''
             UPDATE public."wedac_contacts" 
@@ -873,6 +1178,7 @@ def update_contact():
         '''
         cur.execute(update_sql, (department, name, email, site, contact_id))
         conn.commit()
+        invalidate_cache([department, previous[0] if previous else None], contacts=True)
         
         if cur.rowcount > 0:
             flash(f'Contact {name} updated successfully', 'success')
@@ -900,9 +1206,11 @@ def delete_contact():
         contact_id = request.form.get('contact_id')
         
         # Delete the contact
-        delete_sql = '''DELETE FROM public."wedac_contacts" WHERE id = %s'''
+        delete_sql = '''DELETE FROM public."wedac_contacts" WHERE id = %s RETURNING department'''
         cur.execute(delete_sql, (contact_id,))
+        deleted = cur.fetchone()
         conn.commit()
+        invalidate_cache([deleted[0]] if deleted else [], contacts=True)
         
         if cur.rowcount > 0:
             flash('Contact deleted successfully', 'success')
@@ -920,17 +1228,20 @@ def delete_contact():
     return redirect(url_for('index'))
 @app.route('/debug')
 def debug():
-    conn = get_db_connection()
+    conn = get_db_connection(readonly=True)
     cur = conn.cursor()
     cur.execute("SELECT * FROM public.wedac_contacts LIMIT 5;")
     rows = cur.fetchall()
     return str(rows)
 
 if __name__ == '__main__':
-    #populate(DEPARTMENTS) #Load in views from the schema before running the app
-    #populate_contacts(CONTACTS) #Load in WEDAC contacts from the schema before running the app
+    #get_departments() #Warm the cache with departments from the schema before running the app
+    #get_contacts() #Warm the cache with WEDAC contacts from the schema before running the app
     #update_pope_tech_from_csv('updated_in_popetech.csv') #leave commented out unless file is updated
     #update_views(VIEWS) #Leave commented out; adds pope_tech and error columns to each view
-    #mark_inactive_sites() #Check all URLs in database where pope_tech=False. Uncomment this line to execute
+    # Schema migrations in migrations/ (site_events table, query indexes) are applied with `python migrate.py`
+    #mark_inactive_sites() #Check every primary and alias URL of sites where pope_tech=False. Uncomment this line to execute
+    #update_accessibility_errors() #Crawl active sites and fill in the errors column. Uncomment this line to execute
     #wedacs_list() # Populate DAOffice\Database\FlaskApp\WEDACS folder 
+    # Today's Parquet snapshot of sites, contacts and URL checks for reporting is written with `python snapshot.py` (needs pyarrow)
     app.run(debug=True) #Debug should be set to False in production
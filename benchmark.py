@@ -0,0 +1,400 @@
+"""
+Benchmarks for the index route and the batch jobs in app.py.
+
+Each case seeds a LOCAL PostgreSQL database with a synthetic catalogue (see
+seed.py) and times one code path. URL checks in mark_inactive_sites run
+against a stub HTTP server on localhost that simulates healthy, slow,
+redirecting, erroring and dead hosts, so no real site is contacted. Every
+simulated URL has a host name of its own under STUB_DOMAIN, like the real
+catalogue, so per-host shortcuts in the checker get no unrealistic help.
+
+Results are written as JSON; compare two result files to flag regressions.
+The memory command instead reports how much memory the whole catalogue takes
+when held as DictCursor rows, dicts, tuples and a SiteStore (see site_store.py).
+
+Usage:
+    python benchmark.py run <dsn> --departments 20 --sites 100 --output before.json
+    python benchmark.py run <dsn> --cases index_cold,index_warm,wedacs_list --output after.json
+    python benchmark.py compare before.json after.json --threshold 0.10
+    python benchmark.py memory <dsn> --departments 60 --sites 500
+"""
+import argparse
+import contextlib
+import csv
+import io
+import json
+import multiprocessing
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import psycopg2
+import psycopg2.extras
+
+from seed import seed_catalogue, department_name
+from site_store import SiteStore
+
+# Share of synthetic sites pointed at each kind of stub host, by site id
+STUB_BEHAVIOURS = ['ok'] * 6 + ['slow', 'redirect', 'error', 'dead']
+SLOW_HOST_DELAY = 0.2 # seconds a slow host waits before answering
+STUB_DOMAIN = 'stub.test' # simulated host names, e.g. site12.dev.stub.test; see stub_dns()
+# Served by every healthy stub host: 1 missing alt, 1 empty link and 1 unlabeled
+# field, padded so the crawler streams it in several chunks
+FIXTURE_PAGE = (
+    b'<!DOCTYPE html><html lang="en"><head><title>Stub site</title></head><body>'
+    b'<h1>Stub site</h1><img src="logo.png"><a href="/next"></a><a href="/about">About</a>'
+    b'<form><label for="q">Search</label><input id="q" type="text"><input type="email" name="email">'
+    b'<input type="submit" value="Go"></form>'
+    + b'<p>Lorem ipsum dolor sit amet, consectetur adipiscing elit.</p>' * 400
+    + b'</body></html>'
+)
+
+class StubSiteHandler(BaseHTTPRequestHandler):
+    """Answers /ok/, /slow/, /redirect/ and /error/ paths the way real hosts would"""
+    protocol_version = 'HTTP/1.1' # keep-alive, like real web servers
+
+    def _respond(self, send_body):
+        kind = self.path.strip('/').split('/')[0]
+        if kind == 'slow':
+            time.sleep(SLOW_HOST_DELAY)
+        if kind == 'redirect':
+            self.send_response(302)
+            self.send_header('Location', self.path.replace('/redirect/', '/ok/', 1))
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = FIXTURE_PAGE
+        self.send_response(503 if kind == 'error' else 200)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def do_HEAD(self):
+        self._respond(send_body=False)
+
+    def do_GET(self):
+        self._respond(send_body=True)
+
+    def log_message(self, format, *args):
+        pass # keep benchmark output readable
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass # checkers hang up without reading bodies they do not need
+
+def serve_stub(port_queue):
+    """Process target: serve StubSiteHandler on a free port and report the port"""
+    server = StubServer(('127.0.0.1', 0), StubSiteHandler)
+    port_queue.put(server.server_port)
+    server.serve_forever()
+
+@contextlib.contextmanager
+def stub_sites():
+    """
+    Run the stub server in a separate process, so it does not compete with the
+    code being timed for the GIL; yields (live port, dead port)
+    """
+    port_queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=serve_stub, args=(port_queue,), daemon=True)
+    process.start()
+    port = port_queue.get(timeout=10)
+    # A port that was just released has no listener, so connections are refused like a dead host
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        dead_port = sock.getsockname()[1]
+    try:
+        yield port, dead_port
+    finally:
+        process.terminate()
+        process.join()
+
+@contextlib.contextmanager
+def stub_dns():
+    """
+    Resolve every name under STUB_DOMAIN to 127.0.0.1 in this process, so each
+    simulated URL can have a host of its own while one stub server answers them
+    all. Other names resolve as usual.
+    """
+    real_getaddrinfo = socket.getaddrinfo
+    def getaddrinfo(host, *args, **kwargs):
+        if isinstance(host, str) and host.endswith('.' + STUB_DOMAIN):
+            host = '127.0.0.1'
+        return real_getaddrinfo(host, *args, **kwargs)
+    socket.getaddrinfo = getaddrinfo
+    try:
+        yield
+    finally:
+        socket.getaddrinfo = real_getaddrinfo
+
+def point_sites_at_stub(dsn, port, dead_port):
+    """
+    Rewrite every primary_url and both aliases so they resolve to the stub server
+    according to STUB_BEHAVIOURS, as site<id>.stub.test, site<id>.dev.stub.test and
+    site<id>.stg.stub.test. Each URL of a site gets a different behaviour, so sites
+    with a dead primary but a live dev host occur too.
+    """
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    cur.execute('''
+        CREATE FUNCTION pg_temp.stub_url(n INTEGER, host TEXT, behaviours TEXT[], domain TEXT, port INTEGER, dead_port INTEGER)
+        RETURNS TEXT AS $$
+            SELECT CASE behaviours[1 + n % array_length(behaviours, 1)]
+                WHEN 'dead' THEN 'http://' || host || '.' || domain || ':' || dead_port || '/site/'
+                ELSE 'http://' || host || '.' || domain || ':' || port || '/' || behaviours[1 + n % array_length(behaviours, 1)] || '/'
+            END
+        $$ LANGUAGE sql
+    ''')
+    cur.execute('''
+        UPDATE public.drupal_sites_by_department
+        SET primary_url = pg_temp.stub_url(id, 'site' || id, %(behaviours)s, %(domain)s, %(port)s, %(dead_port)s),
+            aliases = pg_temp.stub_url(id + 3, 'site' || id || '.dev', %(behaviours)s, %(domain)s, %(port)s, %(dead_port)s) || ', ' ||
+                      pg_temp.stub_url(id + 7, 'site' || id || '.stg', %(behaviours)s, %(domain)s, %(port)s, %(dead_port)s)
+    ''', {'behaviours': STUB_BEHAVIOURS, 'domain': STUB_DOMAIN, 'port': port, 'dead_port': dead_port})
+    conn.commit()
+    cur.close()
+    conn.close()
+
+def load_app(dsn):
+    """Import app.py pointed at the benchmark database"""
+    os.environ['DATABASE_URL'] = dsn
+    import app
+    return app
+
+def bench_index_cold(app, ctx):
+    """GET / with every cache empty"""
+    app.CACHE.clear()
+    response = ctx['client'].get('/')
+    assert response.status_code == 200, response.status_code
+
+def bench_index_warm(app, ctx):
+    """GET / with departments, contacts and fragments already cached"""
+    response = ctx['client'].get('/')
+    assert response.status_code == 200, response.status_code
+
+def bench_wedacs_list(app, ctx):
+    """Write the WEDACS/ department folders"""
+    app.wedacs_list()
+
+def bench_update_pope_tech_from_csv(app, ctx):
+    """Mark half the catalogue as in Pope Tech from a CSV export"""
+    app.update_pope_tech_from_csv(ctx['pope_tech_csv'])
+
+def bench_mark_inactive_sites(app, ctx):
+    """Check the primary and alias URLs of every site not in Pope Tech against the stub hosts"""
+    app.mark_inactive_sites()
+
+def bench_update_accessibility_errors(app, ctx):
+    """Crawl every active site on the stub hosts and write error counts"""
+    app.update_accessibility_errors()
+
+# name -> (function, needs the stub server, warm up before timing)
+CASES = {
+    'index_cold': (bench_index_cold, False, False),
+    'index_warm': (bench_index_warm, False, True),
+    'wedacs_list': (bench_wedacs_list, False, False),
+    'update_pope_tech_from_csv': (bench_update_pope_tech_from_csv, False, False),
+    'mark_inactive_sites': (bench_mark_inactive_sites, True, False),
+    'update_accessibility_errors': (bench_update_accessibility_errors, True, False),
+}
+
+def write_pope_tech_csv(path, departments, sites_per_department):
+    """Write a Pope Tech export listing every other synthetic site"""
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=['Title', 'Primary URL (Site folder name)', 'Department'])
+        writer.writeheader()
+        for n in range(1, departments * sites_per_department + 1, 2):
+            writer.writerow({
+                'Title': f'Synthetic Site {n}',
+                'Primary URL (Site folder name)': f'site{n}.example.edu',
+                'Department': department_name((n - 1) // sites_per_department + 1),
+            })
+
+def run_case(app, name, dsn, args, workdir):
+    """Seed, optionally warm up, then time one case args.repeat times"""
+    func, needs_stub, warm_up = CASES[name]
+    timings = []
+    for _ in range(args.repeat):
+        # Batch jobs change pope_tech/active, so every run starts from a fresh catalogue
+        with contextlib.redirect_stdout(io.StringIO()):
+            seed_catalogue(dsn, args.departments, args.sites, args.contacts)
+        app.CACHE.clear()
+        client = app.app.test_client()
+        with client.session_transaction() as session:
+            session['user_id'] = 0
+            session['username'] = 'benchmark'
+        ctx = {'client': client, 'pope_tech_csv': os.path.join(workdir, 'pope_tech.csv')}
+
+        with contextlib.ExitStack() as stack:
+            if needs_stub:
+                port, dead_port = stack.enter_context(stub_sites())
+                stack.enter_context(stub_dns())
+                point_sites_at_stub(dsn, port, dead_port)
+            with contextlib.redirect_stdout(io.StringIO()): # app functions print per row
+                if warm_up:
+                    func(app, ctx)
+                start = time.perf_counter()
+                func(app, ctx)
+                timings.append(time.perf_counter() - start)
+    return {
+        'runs': timings,
+        'min': min(timings),
+        'median': statistics.median(timings),
+        'mean': statistics.mean(timings),
+    }
+
+def git_revision():
+    """Current commit hash, or None outside a git checkout"""
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def run_benchmarks(args):
+    """Run the selected cases and return the JSON-serialisable results"""
+    names = args.cases.split(',') if args.cases else list(CASES)
+    unknown = [name for name in names if name not in CASES]
+    if unknown:
+        sys.exit(f"Unknown cases: {', '.join(unknown)}. Choose from {', '.join(CASES)}")
+
+    app = load_app(args.dsn)
+    results = {}
+    start_dir = os.getcwd()
+    # wedacs_list and mark_inactive_sites write CSVs to the working directory
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        try:
+            write_pope_tech_csv(os.path.join(workdir, 'pope_tech.csv'), args.departments, args.sites)
+            for name in names:
+                results[name] = run_case(app, name, args.dsn, args, workdir)
+                print(f"{name:28} median {results[name]['median'] * 1000:9.1f} ms  "
+                      f"min {results[name]['min'] * 1000:9.1f} ms")
+        finally:
+            os.chdir(start_dir)
+
+    return {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'catalogue': {'departments': args.departments, 'sites_per_department': args.sites,
+                          'contacts_per_department': args.contacts},
+            'repeat': args.repeat,
+        },
+        'results': results,
+    }
+
+def compare_results(baseline, current, threshold):
+    """
+    Compare median timings of two result files.
+
+    Returns:
+        list: names of cases that got slower by more than threshold (a fraction)
+    """
+    regressions = []
+    if baseline['meta'].get('catalogue') != current['meta'].get('catalogue'):
+        print("Warning: the two runs used different catalogue sizes")
+    for name, result in current['results'].items():
+        if name not in baseline['results']:
+            print(f"{name:28} new case, no baseline")
+            continue
+        before = baseline['results'][name]['median']
+        after = result['median']
+        change = (after - before) / before if before else 0.0
+        flag = 'REGRESSION' if change > threshold else ''
+        print(f"{name:28} {before * 1000:9.1f} ms -> {after * 1000:9.1f} ms  {change:+7.1%}  {flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+# name -> function loading the whole catalogue from an executed plain cursor
+MEMORY_LAYOUTS = {
+    'DictCursor rows': None, # fetched through a DictCursor instead
+    'dicts': lambda cur: [dict(zip([desc[0] for desc in cur.description], row)) for row in cur.fetchall()],
+    'tuples': lambda cur: cur.fetchall(),
+    'SiteStore': SiteStore.from_cursor,
+}
+
+def measure_memory(dsn):
+    """
+    Load the whole catalogue in each layout and measure what it keeps allocated.
+
+    Returns:
+        dict: layout name -> {'bytes': ..., 'bytes_per_row': ...}
+    """
+    conn = psycopg2.connect(dsn)
+    results = {}
+    for name, load in MEMORY_LAYOUTS.items():
+        cursor_factory = psycopg2.extras.DictCursor if load is None else None
+        cur = conn.cursor(cursor_factory=cursor_factory)
+        cur.execute('SELECT * FROM public.drupal_sites_by_department ORDER BY department, title, id')
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        data = cur.fetchall() if load is None else load(cur)
+        cur.close() # drop the cursor's own copy so only the loaded rows are counted
+        retained = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        results[name] = {'rows': len(data), 'bytes': retained, 'bytes_per_row': retained / max(len(data), 1)}
+        del data
+    conn.close()
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark app routes and batch jobs against a seeded local database')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='seed a local database and time each case')
+    run_parser.add_argument('dsn', help='connection string of a LOCAL database; its catalogue is replaced')
+    run_parser.add_argument('--departments', type=int, default=20)
+    run_parser.add_argument('--sites', type=int, default=100, help='sites per department')
+    run_parser.add_argument('--contacts', type=int, default=3, help='contacts per department')
+    run_parser.add_argument('--repeat', type=int, default=3, help='timed runs per case')
+    run_parser.add_argument('--cases', help=f"comma separated subset of: {', '.join(CASES)}")
+    run_parser.add_argument('--output', help='write results JSON here')
+
+    compare_parser = subparsers.add_parser('compare', help='flag regressions between two result files')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.10,
+                                help='allowed slowdown as a fraction of the baseline median (default 0.10)')
+    memory_parser = subparsers.add_parser('memory', help='compare the memory taken by the catalogue in each row layout')
+    memory_parser.add_argument('dsn', help='connection string of a LOCAL database; its catalogue is replaced')
+    memory_parser.add_argument('--departments', type=int, default=60)
+    memory_parser.add_argument('--sites', type=int, default=500, help='sites per department')
+    memory_parser.add_argument('--output', help='write results JSON here')
+    args = parser.parse_args()
+
+    if args.command == 'memory':
+        seed_catalogue(args.dsn, args.departments, args.sites)
+        output = measure_memory(args.dsn)
+        for name, result in output.items():
+            print(f"{name:16} {result['bytes'] / 2**20:8.1f} MiB  {result['bytes_per_row']:7.0f} bytes/row")
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(output, f, indent=2)
+            print(f"Results written to {args.output}")
+    elif args.command == 'run':
+        output = run_benchmarks(args)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(output, f, indent=2)
+            print(f"Results written to {args.output}")
+    else:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        regressions = compare_results(baseline, current, args.threshold)
+        sys.exit(1 if regressions else 0)
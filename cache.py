@@ -0,0 +1,237 @@
+"""
+Cache backends for department, contact and site data loaded by app.py.
+
+Under gunicorn every worker is its own process, so module globals like the old
+DEPARTMENTS and CONTACTS lists were loaded (and went stale) once per worker.
+Every backend here exposes the same small get/get_many/set/delete/clear interface so
+app.py can swap them without changing any routes:
+
+    LocalLRUCache   - in-process, one copy per worker. Fine for the local demo
+    RedisCache      - shared by all workers through a Redis server
+    SQLiteCache     - shared by all workers on one host through a SQLite file
+
+make_cache() picks a backend from a URL such as "redis://localhost:6379/0"
+or "sqlite:////tmp/sites_cache.db"; anything else falls back to the LRU.
+"""
+import os
+import pickle # Values are pickled so shared backends can store any python object
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class CacheBackend:
+    """Interface every cache backend implements"""
+
+    def get(self, key):
+        """Return the cached value for key, or None if missing or expired"""
+        raise NotImplementedError
+
+    def get_many(self, keys):
+        """Return a list with get(key) for every key. Shared backends override this with one round trip"""
+        return [self.get(key) for key in keys]
+
+    def set(self, key, value, ttl=None):
+        """Store value under key. ttl is in seconds; None means no expiry"""
+        raise NotImplementedError
+
+    def delete(self, *keys):
+        """Remove one or more keys. Missing keys are ignored"""
+        raise NotImplementedError
+
+    def clear(self):
+        """Remove every key this backend owns"""
+        raise NotImplementedError
+
+
+class LocalLRUCache(CacheBackend):
+    """
+    In-process LRU cache. Each worker holds its own copy, so invalidation
+    only reaches the worker that performed the write.
+
+    Args:
+        max_entries (int): Least recently used keys are evicted past this size
+    """
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._data = OrderedDict() # key -> (expires_at, value)
+        self._lock = threading.Lock() # Flask's dev server and gunicorn threads share this object
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key) # mark as most recently used
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False) # evict least recently used
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class RedisCache(CacheBackend):
+    """
+    Cache shared by every worker through Redis. Deleting a key is immediately
+    visible to all workers, so invalidation propagates without any messaging.
+
+    Args:
+        url (str): Redis URL, e.g. redis://localhost:6379/0
+        prefix (str): Namespace for keys so clear() only touches this app's keys
+        client: Optional pre-built client with the redis-py interface. Tests can
+                pass a stand-in such as fakeredis.FakeRedis() here
+    """
+
+    def __init__(self, url=None, prefix='sites:', client=None):
+        if client is None:
+            try:
+                import redis # Optional dependency, only needed for this backend
+            except ImportError:
+                raise ImportError("RedisCache requires the 'redis' package: pip install redis")
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return pickle.loads(raw) if raw is not None else None
+
+    def get_many(self, keys):
+        if not keys:
+            return []
+        return [pickle.loads(raw) if raw is not None else None
+                for raw in self.client.mget([self.prefix + key for key in keys])]
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=ttl or None) # redis rejects ex=0; 0 means no expiry like the other backends
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*[self.prefix + key for key in keys])
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=self.prefix + '*'))
+        if keys:
+            self.client.delete(*keys)
+
+
+class SQLiteCache(CacheBackend):
+    """
+    Cache shared by every worker on one host through a SQLite file. A new
+    connection is opened per call so the object is safe to use after gunicorn
+    forks its workers.
+
+    Args:
+        path (str): Location of the SQLite database file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS cache (
+                    key TEXT PRIMARY KEY,
+                    value BLOB NOT NULL,
+                    expires_at REAL
+                )
+            ''')
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute('PRAGMA journal_mode=WAL') # Readers don't block the writer
+        return conn
+
+    def get(self, key):
+        conn = self._connect()
+        try:
+            row = conn.execute('SELECT value, expires_at FROM cache WHERE key = ?', (key,)).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at is not None and expires_at < time.time():
+            self.delete(key)
+            return None
+        return pickle.loads(value)
+
+    def get_many(self, keys):
+        if not keys:
+            return []
+        conn = self._connect()
+        try:
+            found = {}
+            for start in range(0, len(keys), 500): # stay under SQLite's bound parameter limit
+                chunk = keys[start:start + 500]
+                placeholders = ', '.join('?' * len(chunk))
+                found.update((key, (value, expires_at)) for key, value, expires_at in conn.execute(
+                    f'SELECT key, value, expires_at FROM cache WHERE key IN ({placeholders})', chunk))
+        finally:
+            conn.close()
+        now = time.time()
+        # Expired rows are treated as misses and left for set() to overwrite
+        return [pickle.loads(found[key][0]) if key in found and (found[key][1] is None or found[key][1] >= now) else None
+                for key in keys]
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + ttl if ttl else None
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute('INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)',
+                             (key, pickle.dumps(value), expires_at))
+        finally:
+            conn.close()
+
+    def delete(self, *keys):
+        if not keys:
+            return
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany('DELETE FROM cache WHERE key = ?', [(key,) for key in keys])
+        finally:
+            conn.close()
+
+    def clear(self):
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute('DELETE FROM cache')
+        finally:
+            conn.close()
+
+
+def make_cache(url=None):
+    """
+    Build a cache backend from a URL, defaulting to the CACHE_URL environment
+    variable.
+
+    Args:
+        url (str): redis://..., rediss://..., sqlite:///<path> or None for LocalLRUCache
+    """
+    url = url if url is not None else os.environ.get('CACHE_URL', '')
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisCache(url)
+    if url.startswith('sqlite:///'):
+        return SQLiteCache(url[len('sqlite:///'):])
+    return LocalLRUCache()
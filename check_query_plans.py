@@ -0,0 +1,154 @@
+"""
+Query plan regression check.
+
+Seeds a LOCAL PostgreSQL database with a synthetic catalogue (see seed.py),
+runs EXPLAIN on each query app.py and its batch jobs send to
+drupal_sites_by_department, wedac_contacts, site_events and site_url_checks,
+and exits non-zero if any of them falls back to a sequential scan or does not
+use the index it was written for.
+
+Usage:
+    python check_query_plans.py postgresql://postgres@localhost/sites_test
+    python check_query_plans.py <dsn> --departments 200 --sites 1000
+    python check_query_plans.py <dsn> --no-seed    # reuse an already seeded database
+"""
+import argparse
+import json
+import sys
+
+import psycopg2
+import psycopg2.extras
+
+from seed import seed_catalogue, department_name
+
+WHOLE_TABLE = 'whole table'
+
+def queries():
+    """
+    (name, sql, params, index) for every statement checked. The SQL is imported from
+    app.py, so the check covers the statements that actually ship.
+
+    params:
+        tuple        positional parameters of the statement
+        list         rows for a psycopg2.extras.execute_values() statement (VALUES %s),
+                     one page of the size the batch job sends
+    index:
+        None         the plan must not contain a sequential scan
+        index name   a sequential scan can legitimately be the cheapest plan (bulk reads
+                     of a large share of a table), so the check disables seq scans and
+                     requires this index to be the one used. Any other index is a failure:
+                     with seq scans off the planner will scan an unrelated index end to end
+                     rather than fall back, which proves nothing
+        WHOLE_TABLE  reads all or most of the table, so any plan is fine; each entry says why
+    """
+    import app # imported here so --help works without the app's dependencies
+
+    department = department_name(1)
+    return [
+        ('populate: department names', # DISTINCT over every row of the catalogue
+         app.DEPARTMENT_NAMES_SQL, (), WHOLE_TABLE),
+        ('populate: department rows',
+         app.DEPARTMENT_ROWS_SQL, (department,), None),
+        ('populate_contacts', # every contact, a few hundred rows
+         app.CONTACTS_SQL, (), WHOLE_TABLE),
+        ('update: lock current row',
+         app.LOCK_SITE_SQL, (1,), None),
+        ('move_all: move and log sites',
+         app.MOVE_ALL_SQL, ('Somewhere', department, department, 'Somewhere', None), None),
+        ('update_pope_tech_from_csv',
+         app.UPDATE_POPE_TECH_SQL, ('site1.example.edu',), None),
+        ('get_site_history',
+         app.SITE_HISTORY_SQL, (1, 100), None),
+        ('get_department_history',
+         app.DEPARTMENT_HISTORY_SQL, (department, 100, department, 100, 100), None),
+        ('mark_inactive_sites: sites to check',
+         app.UNCHECKED_SITES_SQL, (), 'drupal_sites_not_in_pope_tech_idx'),
+        ('mark_inactive_sites: replace URL checks',
+         app.DELETE_URL_CHECKS_SQL, ([1, 2, 3],), 'site_url_checks_pkey'),
+        ('mark_inactive_sites: store URL checks',
+         app.INSERT_URL_CHECKS_SQL,
+         [(n, f'https://site{n}.example.edu', 'primary', True, 200, None, 100) for n in range(1, 1001)], None),
+        ('mark_inactive_sites: update active',
+         app.UPDATE_ACTIVE_SQL, [(n, False) for n in range(1, 1001)], 'drupal_sites_by_department_pkey'),
+        ('mark_inactive_sites: broken aliases',
+         app.BROKEN_ALIASES_SQL, (), 'site_url_checks_down_idx'),
+        ('update_accessibility_errors: active sites', # most of the catalogue is active
+         app.ACTIVE_SITES_SQL, (), WHOLE_TABLE),
+        ('update_accessibility_errors: update errors',
+         app.UPDATE_ERRORS_SQL, [(n, 0) for n in range(1, 101)], None),
+        ('wedacs_list: departments', # wedac_contacts holds a few hundred rows
+         app.WEDAC_DEPARTMENTS_SQL, (), WHOLE_TABLE),
+        ('wedacs_list: contacts',
+         app.CONTACTS_BY_DEPARTMENT_SQL, (), WHOLE_TABLE),
+        ('wedacs_list: catalogue',
+         app.SITES_BY_DEPARTMENT_SQL, (), WHOLE_TABLE),
+    ]
+
+def plan_nodes(plan):
+    """Yield every node of an EXPLAIN (FORMAT JSON) plan"""
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from plan_nodes(child)
+
+def explain(cur, sql, params, index):
+    """
+    EXPLAIN one query (never executed) and return why its plan is unacceptable.
+
+    Returns:
+        str: description of the problem, or None if the plan is fine
+    """
+    if index == WHOLE_TABLE:
+        return None
+    if index:
+        cur.execute('SET LOCAL enable_seqscan = off') # only fall back to a seq scan if no index fits
+    if isinstance(params, list):
+        psycopg2.extras.execute_values(cur, 'EXPLAIN (FORMAT JSON) ' + sql, params, page_size=len(params))
+    else:
+        cur.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+    plan = cur.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    nodes = list(plan_nodes(plan[0]['Plan']))
+    tables = [node.get('Relation Name') for node in nodes if node.get('Node Type') == 'Seq Scan']
+    if tables:
+        return f"seq scan on {', '.join(tables)}"
+    used = [node['Index Name'] for node in nodes if 'Index Name' in node]
+    if index and index not in used:
+        return f"uses {', '.join(used) or 'no index'} instead of {index}"
+    return None
+
+def check_query_plans(dsn):
+    """
+    EXPLAIN every entry of queries() against a seeded database.
+
+    Returns:
+        list: (name, problem) for each failing query
+    """
+    failures = []
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    for name, sql, params, index in queries():
+        problem = explain(cur, sql, params, index)
+        conn.rollback() # drop SET LOCAL and the row lock EXPLAIN never took anyway
+        status = 'FAIL' if problem else 'ok'
+        print(f"{status:4}  {name}" + (f"  ({problem})" if problem else ''))
+        if problem:
+            failures.append((name, problem))
+    cur.close()
+    conn.close()
+    return failures
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='EXPLAIN the app queries against a seeded local database')
+    parser.add_argument('dsn', help='connection string of a LOCAL database; its catalogue is replaced unless --no-seed')
+    parser.add_argument('--departments', type=int, default=60)
+    parser.add_argument('--sites', type=int, default=500, help='sites per department')
+    parser.add_argument('--no-seed', action='store_true', help='use the data already in the database')
+    args = parser.parse_args()
+
+    if not args.no_seed:
+        seed_catalogue(args.dsn, args.departments, args.sites)
+    checked = len(queries())
+    failures = check_query_plans(args.dsn)
+    print(f"{checked - len(failures)}/{checked} queries use the intended plan")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,135 @@
+"""
+Read replica routing check.
+
+Takes two LOCAL PostgreSQL databases, ideally on two separate instances: one
+plays the primary (DATABASE_URL) and the other the read replica
+(DATABASE_READ_URL). Both are seeded with the same catalogue and then tagged
+differently, and nothing replicates between them. That acts like a replica
+with unbounded lag, so every read shows which database answered it. The check
+then drives the app as two logged-in users:
+
+    - before any write, history is read from the replica
+    - user A can save an edit using the row_version rendered from the replica
+    - right after the edit, A's reads and the shared cache use the primary
+    - user B, who wrote nothing, still reads history from the replica
+    - once READ_YOUR_WRITES_SECONDS have passed, A is back on the replica
+
+Usage:
+    python check_read_routing.py <primary dsn> <replica dsn>
+    python check_read_routing.py postgresql://postgres@localhost:5432/sites_test \\
+        postgresql://postgres@localhost:5433/sites_test --window 2
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+import psycopg2
+
+from seed import seed_catalogue
+
+SITE_ID = 1
+
+def tag_database(dsn, tag):
+    """Add a site_events row naming the database, so history responses show where they came from"""
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    cur.execute('''
+        INSERT INTO public.site_events (site_id, event_type, department, username)
+        SELECT id, 'tag', department, %s FROM public.drupal_sites_by_department WHERE id = %s
+    ''', (tag, SITE_ID))
+    conn.commit()
+    cur.close()
+    conn.close()
+
+def history_source(client):
+    """'primary' or 'replica', depending on which tag row /history/site returned"""
+    response = client.get(f'/history/site/{SITE_ID}')
+    assert response.status_code == 200, response.status_code
+    tags = [event['username'] for event in response.get_json() if event['event_type'] == 'tag']
+    return tags[0] if tags else None
+
+def logged_in_client(app, username):
+    client = app.app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = 0
+        session['username'] = username
+    return client
+
+def rendered_row_version(client):
+    """row_version the index page hands the edit modal for SITE_ID, as a user's browser would post it"""
+    page = client.get('/').get_data(as_text=True)
+    match = re.search(rf"openEditModal\('{SITE_ID}', [^)]*, '([^']*)'\)", page)
+    assert match, f"no edit button for site {SITE_ID}"
+    return match.group(1)
+
+def current_site(dsn):
+    """(department, row_version) of SITE_ID on the given database"""
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    cur.execute('SELECT department, row_version::text FROM public.drupal_sites_by_department WHERE id = %s', (SITE_ID,))
+    row = cur.fetchone()
+    cur.close()
+    conn.close()
+    return row
+
+def check_read_routing(primary_dsn, replica_dsn, window):
+    """
+    Run the scenario against the app.
+
+    Returns:
+        list: descriptions of the checks that failed
+    """
+    os.environ['DATABASE_URL'] = primary_dsn
+    os.environ['DATABASE_READ_URL'] = replica_dsn
+    os.environ['READ_YOUR_WRITES_SECONDS'] = str(window)
+    import app
+
+    failures = []
+    def expect(description, actual, expected):
+        status = 'ok' if actual == expected else 'FAIL'
+        print(f"{status:4}  {description}" + ('' if actual == expected else f"  (got {actual!r})"))
+        if actual != expected:
+            failures.append(description)
+
+    app.CACHE.clear()
+    user_a = logged_in_client(app, 'user-a')
+    user_b = logged_in_client(app, 'user-b')
+    expect('history is read from the replica', history_source(user_a), 'replica')
+
+    note = f'Routing check {time.time()}'
+    department = current_site(primary_dsn)[0]
+    department_id = f'{department.split(" ")[0]}View'
+    row_version = rendered_row_version(user_a) # warms the cache from the replica
+    response = user_a.post('/update', data={
+        'id': SITE_ID, 'table_name': department_id, 'row_version': row_version, 'notes': note,
+    })
+    expect('edit is saved', response.status_code, 302)
+    expect('edit went to the primary', current_site(replica_dsn)[1] != current_site(primary_dsn)[1], True)
+
+    expect("writer's history comes from the primary", history_source(user_a), 'primary')
+    expect('other users keep reading history from the replica', history_source(user_b), 'replica')
+    # The replica never sees the edit, so the note only appears if the cache was reloaded from the primary
+    expect("writer's index shows the edit", note in user_a.get('/').get_data(as_text=True), True)
+    expect("other users' index shows the edit", note in user_b.get('/').get_data(as_text=True), True)
+
+    time.sleep(window + 0.5)
+    expect('writer is back on the replica after the window', history_source(user_a), 'replica')
+    return failures
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check that reads go to the replica and writes are read back from the primary')
+    parser.add_argument('primary', help='connection string of a LOCAL database used as the primary; its catalogue is replaced')
+    parser.add_argument('replica', help='connection string of a second LOCAL database used as the replica; its catalogue is replaced')
+    parser.add_argument('--window', type=int, default=2, help='READ_YOUR_WRITES_SECONDS to run the app with')
+    parser.add_argument('--departments', type=int, default=5)
+    parser.add_argument('--sites', type=int, default=20, help='sites per department')
+    args = parser.parse_args()
+
+    for dsn, tag in ((args.primary, 'primary'), (args.replica, 'replica')):
+        seed_catalogue(dsn, args.departments, args.sites)
+        tag_database(dsn, tag)
+    failures = check_read_routing(args.primary, args.replica, args.window)
+    print(f"{len(failures)} checks failed" if failures else "All checks passed")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,150 @@
+"""
+URL liveness checks for mark_inactive_sites.
+
+A site is reachable under its primary_url and every alias (the .dev/.stg
+environment hosts, www. variants, old names). site_urls() expands a row into
+those URLs, tagged 'primary', 'alias' (another production host) or
+'environment' (a dev/stg host), and check_urls() checks a whole catalogue's
+worth of them in one pass:
+
+    - each distinct URL is requested once, however many sites list it
+    - one shared session keeps connections to a host open between URLs
+    - the first URL on a host probes it; if the host cannot be reached at all
+      (DNS failure, refused, TLS error) its other URLs are marked down without
+      another request
+    - a HEAD is tried first; only servers that reject it get a GET, whose body
+      is never downloaded
+"""
+import itertools
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, urlunsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+UrlStatus = namedtuple('UrlStatus', 'is_up status_code error elapsed_ms')
+
+# Host labels of non-production environments, as in site.dev.umn.edu and site.stg.umn.edu
+ENVIRONMENT_LABELS = {'dev', 'stg', 'stage', 'staging', 'test', 'tst', 'qa'}
+
+def normalize_url(url):
+    """
+    Lowercase the host, default to http:// and drop a bare trailing slash so duplicates
+    compare equal. Returns None for blank URLs and ones urlsplit() rejects (e.g. a stray [)
+    """
+    url = (url or '').strip()
+    if not url:
+        return None
+    if '://' not in url:
+        url = f'http://{url}'
+    try:
+        scheme, netloc, path, query, _ = urlsplit(url)
+    except ValueError:
+        return None
+    if path == '/':
+        path = ''
+    return urlunsplit((scheme.lower(), netloc.lower(), path, query, ''))
+
+def is_environment_url(url):
+    """True for dev/stg hosts, whose status says nothing about the production site"""
+    host = urlsplit(url).hostname or ''
+    return any(label in ENVIRONMENT_LABELS for label in host.split('.'))
+
+def site_urls(primary_url, aliases, environments=None):
+    """
+    Return [(url, kind)] for one site, primary first, without duplicates. kind is
+    'primary', 'alias' for other production hosts or 'environment' for dev/stg hosts.
+
+    Args:
+        primary_url (str): The site's primary_url column
+        aliases (str): Comma separated aliases column
+        environments (str): Comma separated environments column. It normally holds
+            environment names (dev, test, prod) whose hosts are already in aliases,
+            but any entry that looks like a host name is checked as an alias too.
+    """
+    candidates = [(primary_url, 'primary')]
+    candidates += [(alias, 'alias') for alias in (aliases or '').split(',')]
+    candidates += [(env, 'alias') for env in (environments or '').split(',') if '.' in env]
+    urls = {}
+    for url, kind in candidates:
+        url = normalize_url(url)
+        if url and url not in urls:
+            urls[url] = 'environment' if kind == 'alias' and is_environment_url(url) else kind
+    return list(urls.items())
+
+def url_host(url):
+    return urlsplit(url).netloc
+
+def fetch_status(session, url, timeout):
+    """HEAD the URL, falling back to a GET for servers that reject HEAD; raises on no response"""
+    response = session.head(url, allow_redirects=True, timeout=timeout)
+    # Servers that do not handle HEAD answer 4xx or 501; other 5xx mean the site itself is down
+    if 400 <= response.status_code < 500 or response.status_code == 501:
+        # stream=True only reads the headers; the body is discarded when the response closes
+        with session.get(url, allow_redirects=True, timeout=timeout, stream=True) as response:
+            pass
+    return response.status_code, int(response.elapsed.total_seconds() * 1000)
+
+def check_urls(urls, max_workers=50, timeout=10):
+    """
+    Check many URLs concurrently.
+
+    Args:
+        urls (iterable): URLs as returned by site_urls(); duplicates are checked once
+        max_workers (int): Parallel requests across all hosts
+        timeout (int): Seconds to wait for each server
+
+    Returns:
+        dict: url -> UrlStatus
+    """
+    by_host = {}
+    for url in dict.fromkeys(urls):
+        by_host.setdefault(url_host(url), []).append(url)
+    # Round robin across hosts so workers are not all queued on the same one
+    ordered = [url for group in itertools.zip_longest(*by_host.values()) for url in group if url]
+
+    session = requests.Session()
+    # Shared by every worker; keep up to one open connection per worker for each host
+    adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    lock = threading.Lock()
+    probes = {} # host -> Event set once its first URL has been checked
+    unreachable = {} # host -> exception name, for hosts that never answered
+
+    def check(url):
+        host = url_host(url)
+        with lock:
+            probe = probes.get(host)
+            is_probe = probe is None
+            if is_probe:
+                probe = probes[host] = threading.Event()
+        if not is_probe:
+            probe.wait()
+            if host in unreachable:
+                return url, UrlStatus(False, None, unreachable[host], None)
+        try:
+            status_code, elapsed_ms = fetch_status(session, url, timeout)
+            return url, UrlStatus(status_code == 200, status_code, None, elapsed_ms)
+        except requests.RequestException as e:
+            # Only a failure on this host itself, not on a host it redirected to, condemns the host
+            failed_here = e.request is not None and url_host(e.request.url) == host
+            if is_probe and isinstance(e, requests.ConnectionError) and failed_here:
+                unreachable[host] = type(e).__name__
+            return url, UrlStatus(False, None, type(e).__name__, None)
+        except ValueError as e:
+            # A URL requests cannot parse, e.g. urllib3's LocationParseError for a..b.com. It may be
+            # a redirect target rather than this host, and fails without a request, so only this URL is down
+            return url, UrlStatus(False, None, type(e).__name__, None)
+        finally:
+            if is_probe:
+                probe.set()
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return dict(executor.map(check, ordered))
+    finally:
+        session.close()
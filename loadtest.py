@@ -0,0 +1,295 @@
+"""
+Concurrent-user load test for the Flask app.
+
+Seeds a LOCAL PostgreSQL database (see seed.py), starts the app on a local
+port (or targets --url), logs each virtual user in through /login and has them
+mix page loads, edits, moves, history lookups and contact changes at a target
+request rate. Reports p50/p95/p99 latency, throughput and error rate per route.
+
+Search and filtering run in the browser (static/script.js), so they put no
+load on the server beyond the page load and are not simulated.
+
+Usage:
+    python loadtest.py <dsn> --users 20 --rate 10 --duration 60
+    python loadtest.py <dsn> --url http://127.0.0.1:8000 --no-seed --output load.json
+"""
+import argparse
+import json
+import logging
+import random
+import threading
+import time
+from collections import defaultdict
+
+import psycopg2
+import requests
+from werkzeug.security import generate_password_hash
+from werkzeug.serving import make_server
+
+from benchmark import load_app
+from seed import seed_catalogue
+
+LOADTEST_USER = 'loadtest'
+LOADTEST_PASSWORD = 'loadtest-password'
+
+# route name -> (relative weight in the mix, VirtualUser method that sends it)
+SCENARIO = {
+    'GET /': (55, 'do_index'),
+    'POST /update': (20, 'do_update'),
+    'POST /move': (5, 'do_move'),
+    'GET /history/site': (5, 'do_history_site'),
+    'POST /contact/create': (5, 'do_contact_create'),
+    'POST /contact/update': (5, 'do_contact_update'),
+    'POST /contact/delete': (5, 'do_contact_delete'),
+}
+
+def create_loadtest_user(dsn):
+    """Add (or reset) the account virtual users log in with"""
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    cur.execute('''
+        INSERT INTO public.users (username, password_hash, role) VALUES (%s, %s, 'editor')
+        ON CONFLICT (username) DO UPDATE SET password_hash = EXCLUDED.password_hash
+    ''', (LOADTEST_USER, generate_password_hash(LOADTEST_PASSWORD)))
+    conn.commit()
+    cur.close()
+    conn.close()
+
+class Stats:
+    """Thread-safe latency and status collection per route"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    def record(self, route, seconds, status):
+        with self.lock:
+            self.latencies[route].append(seconds)
+            self.statuses[route][status] += 1
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, int(round(p / 100 * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+class VirtualUser(threading.Thread):
+    """
+    One logged-in editor sending requests at a fixed pace until the deadline.
+
+    Args:
+        base_url (str): Where the app is served
+        dsn (str): Seeded database, read to pick rows the way the page would show them
+        interval (float): Seconds between this user's requests
+        deadline (float): time.monotonic() value at which to stop
+        stats (Stats): Shared collector
+        seed (int): Per-user random seed so runs are repeatable
+    """
+
+    def __init__(self, base_url, dsn, interval, deadline, stats, seed):
+        super().__init__(daemon=True)
+        self.base_url = base_url
+        self.dsn = dsn
+        self.interval = interval
+        self.deadline = deadline
+        self.stats = stats
+        self.random = random.Random(seed)
+        self.email = f'loadtest{seed}@example.edu'
+
+    def run(self):
+        self.session = requests.Session()
+        self.conn = psycopg2.connect(self.dsn)
+        self.conn.autocommit = True
+        try:
+            self.timed('POST /login', lambda: self.session.post(
+                self.base_url + '/login', data={'username': LOADTEST_USER, 'password': LOADTEST_PASSWORD}))
+            routes = list(SCENARIO)
+            weights = [weight for weight, method in SCENARIO.values()]
+            next_at = time.monotonic() + self.random.uniform(0, self.interval) # stagger users
+            while True:
+                time.sleep(max(0, next_at - time.monotonic()))
+                if time.monotonic() >= self.deadline:
+                    break
+                route = self.random.choices(routes, weights)[0]
+                self.timed(route, getattr(self, SCENARIO[route][1])())
+                next_at += self.interval
+        finally:
+            self.conn.close()
+            self.session.close()
+
+    def timed(self, route, send):
+        """Send one prepared request and record its latency, including any redirect it follows"""
+        start = time.perf_counter()
+        try:
+            status = send().status_code
+        except requests.RequestException as e:
+            status = type(e).__name__
+        self.stats.record(route, time.perf_counter() - start, status)
+
+    # Each do_* picks its data first (untimed) and returns the request to send
+
+    def random_site(self):
+        """id, department and row version of a random site, as the edit modal would have them"""
+        cur = self.conn.cursor()
+        cur.execute('''SELECT id, department, row_version::text FROM public.drupal_sites_by_department
+                       OFFSET floor(random() * (SELECT count(*) FROM public.drupal_sites_by_department)) LIMIT 1''')
+        row = cur.fetchone()
+        cur.close()
+        return row
+
+    def random_department(self):
+        cur = self.conn.cursor()
+        cur.execute('SELECT DISTINCT department FROM public.drupal_sites_by_department')
+        departments = [row[0] for row in cur.fetchall()]
+        cur.close()
+        return self.random.choice(departments)
+
+    def own_contacts(self):
+        """Contacts this user created, identified by its own email address"""
+        cur = self.conn.cursor()
+        cur.execute('SELECT id, department FROM public.wedac_contacts WHERE email = %s', (self.email,))
+        contacts = cur.fetchall()
+        cur.close()
+        return contacts
+
+    def do_index(self):
+        return lambda: self.session.get(self.base_url + '/')
+
+    def do_update(self):
+        site_id, department, row_version = self.random_site()
+        return lambda: self.session.post(self.base_url + '/update', data={
+            'id': site_id,
+            'table_name': f'{department.split(" ")[0]}View',
+            'row_version': row_version,
+            'notes': f'Load test edit {self.random.randint(0, 10**6)}',
+        })
+
+    def do_move(self):
+        site_id, department, row_version = self.random_site()
+        target_department = self.random_department()
+        return lambda: self.session.post(self.base_url + '/move', data={
+            'id_value': site_id,
+            'target_department': target_department,
+        })
+
+    def do_history_site(self):
+        site_id, department, row_version = self.random_site()
+        return lambda: self.session.get(f'{self.base_url}/history/site/{site_id}')
+
+    def do_contact_create(self):
+        department = self.random_department()
+        return lambda: self.session.post(self.base_url + '/contact/create', data={
+            'department': department, 'name': f'Load Test {self.random.randint(0, 10**6)}',
+            'email': self.email, 'site': '',
+        })
+
+    def do_contact_update(self):
+        contacts = self.own_contacts()
+        if not contacts:
+            return self.do_contact_create()
+        contact_id, department = self.random.choice(contacts)
+        return lambda: self.session.post(self.base_url + '/contact/update', data={
+            'contact_id': contact_id, 'department': department,
+            'name': f'Load Test {self.random.randint(0, 10**6)}', 'email': self.email, 'site': '',
+        })
+
+    def do_contact_delete(self):
+        contacts = self.own_contacts()
+        if not contacts:
+            return self.do_contact_create()
+        contact_id, department = self.random.choice(contacts)
+        return lambda: self.session.post(self.base_url + '/contact/delete', data={'contact_id': contact_id})
+
+def serve_app(dsn):
+    """Start app.py on a free local port in a background thread; returns (base URL, server)"""
+    app = load_app(dsn)
+    logging.getLogger('werkzeug').setLevel(logging.WARNING) # no access log line per request
+    server = make_server('127.0.0.1', 0, app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.server_port}', server
+
+def summarise(stats, elapsed):
+    """Per-route latency percentiles, throughput and error rate"""
+    report = {}
+    for route in sorted(stats.latencies):
+        latencies = sorted(stats.latencies[route])
+        statuses = dict(stats.statuses[route])
+        conflicts = statuses.get(409, 0)
+        errors = sum(count for status, count in statuses.items()
+                     if not isinstance(status, int) or (status >= 400 and status != 409))
+        report[route] = {
+            'requests': len(latencies),
+            'throughput_rps': len(latencies) / elapsed,
+            'p50_ms': percentile(latencies, 50) * 1000,
+            'p95_ms': percentile(latencies, 95) * 1000,
+            'p99_ms': percentile(latencies, 99) * 1000,
+            'error_rate': errors / len(latencies),
+            'conflicts': conflicts,
+            'statuses': {str(status): count for status, count in statuses.items()},
+        }
+    return report
+
+def print_report(report, elapsed):
+    print(f"{'route':24} {'reqs':>6} {'rps':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7} {'409s':>5}")
+    for route, row in report.items():
+        print(f"{route:24} {row['requests']:6} {row['throughput_rps']:7.2f} {row['p50_ms']:8.1f} "
+              f"{row['p95_ms']:8.1f} {row['p99_ms']:8.1f} {row['error_rate']:7.1%} {row['conflicts']:5}")
+    total = sum(row['requests'] for row in report.values())
+    print(f"{total} requests in {elapsed:.1f} s ({total / elapsed:.2f} req/s)")
+
+def run_load_test(args):
+    """Seed, start the app if needed, run the virtual users and return the report"""
+    if not args.no_seed:
+        seed_catalogue(args.dsn, args.departments, args.sites, args.contacts)
+    create_loadtest_user(args.dsn)
+
+    server = None
+    base_url = args.url
+    if not base_url:
+        base_url, server = serve_app(args.dsn)
+        print(f"Serving app on {base_url}")
+
+    stats = Stats()
+    interval = args.users / args.rate # each user's share of the target rate
+    start = time.monotonic()
+    deadline = start + args.duration
+    users = [VirtualUser(base_url, args.dsn, interval, deadline, stats, seed=n) for n in range(args.users)]
+    for user in users:
+        user.start()
+    for user in users:
+        user.join()
+    elapsed = time.monotonic() - start
+    if server:
+        server.shutdown()
+
+    report = summarise(stats, elapsed)
+    print_report(report, elapsed)
+    return {
+        'config': {'users': args.users, 'rate': args.rate, 'duration': args.duration, 'url': base_url,
+                   'catalogue': {'departments': args.departments, 'sites_per_department': args.sites,
+                                 'contacts_per_department': args.contacts}},
+        'elapsed': elapsed,
+        'routes': report,
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Simulate concurrent editors against a seeded local database')
+    parser.add_argument('dsn', help='connection string of a LOCAL database; its catalogue is replaced unless --no-seed')
+    parser.add_argument('--url', help='target an already running app (e.g. gunicorn) instead of starting one')
+    parser.add_argument('--users', type=int, default=10, help='concurrent virtual users')
+    parser.add_argument('--rate', type=float, default=5.0, help='target requests per second across all users')
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds to run')
+    parser.add_argument('--departments', type=int, default=20)
+    parser.add_argument('--sites', type=int, default=100, help='sites per department')
+    parser.add_argument('--contacts', type=int, default=3, help='contacts per department')
+    parser.add_argument('--no-seed', action='store_true', help='use the data already in the database')
+    parser.add_argument('--output', help='write the report JSON here')
+    args = parser.parse_args()
+
+    output = run_load_test(args)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(output, f, indent=2)
+        print(f"Report written to {args.output}")
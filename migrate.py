@@ -0,0 +1,86 @@
+"""
+Versioned schema migrations for the sites database.
+
+Each file in migrations/ is named <version>_<description>.sql and is applied
+once, in version order, inside its own transaction. Applied versions are
+recorded in public.schema_migrations so re-running is safe.
+
+Usage:
+    python migrate.py              # apply pending migrations to DATABASE_URL
+    python migrate.py --status     # list applied and pending migrations
+"""
+import os
+import sys
+
+import psycopg2
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+def list_migrations():
+    """Return [(version, filename)] for every .sql file in migrations/, sorted by version"""
+    migrations = []
+    for filename in os.listdir(MIGRATIONS_DIR):
+        if filename.endswith('.sql'):
+            version = int(filename.split('_', 1)[0])
+            migrations.append((version, filename))
+    return sorted(migrations)
+
+def applied_versions(cur):
+    """Create the bookkeeping table if needed and return the set of applied versions"""
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS public.schema_migrations (
+            version INTEGER PRIMARY KEY,
+            filename TEXT NOT NULL,
+            applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+    ''')
+    cur.execute('SELECT version FROM public.schema_migrations')
+    return {row[0] for row in cur.fetchall()}
+
+def run_migrations(dsn=None):
+    """
+    Apply every pending migration in version order.
+
+    Args:
+        dsn (str): Connection string of the primary database. Defaults to DATABASE_URL
+    """
+    conn = psycopg2.connect(dsn or os.environ.get('DATABASE_URL'))
+    cur = conn.cursor()
+    try:
+        applied = applied_versions(cur)
+        conn.commit()
+        pending = [(version, filename) for version, filename in list_migrations() if version not in applied]
+        for version, filename in pending:
+            with open(os.path.join(MIGRATIONS_DIR, filename), 'r') as f:
+                sql = f.read()
+            try:
+                cur.execute(sql)
+                cur.execute('INSERT INTO public.schema_migrations (version, filename) VALUES (%s, %s)',
+                            (version, filename))
+                conn.commit()
+                print(f"Applied {filename}")
+            except psycopg2.Error as e:
+                conn.rollback()
+                print(f"Error applying {filename}: {e}")
+                raise
+        print(f"{len(pending)} migrations applied, schema is up to date")
+    finally:
+        cur.close()
+        conn.close()
+
+def print_status(dsn=None):
+    """Print which migrations have been applied"""
+    conn = psycopg2.connect(dsn or os.environ.get('DATABASE_URL'))
+    cur = conn.cursor()
+    applied = applied_versions(cur)
+    conn.commit()
+    for version, filename in list_migrations():
+        print(f"{'applied' if version in applied else 'pending'}  {filename}")
+    cur.close()
+    conn.close()
+
+if __name__ == '__main__':
+    if '--status' in sys.argv:
+        print_status()
+    else:
+        run_migrations()
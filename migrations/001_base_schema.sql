@@ -0,0 +1,32 @@
+-- Tables the app expects. They already exist in production, so IF NOT EXISTS
+-- makes this a no-op there; it lets a fresh local database be built for
+-- development, query plan checks and benchmarks.
+CREATE TABLE IF NOT EXISTS public.drupal_sites_by_department (
+    id INTEGER PRIMARY KEY,
+    title TEXT,
+    environments TEXT,
+    aliases TEXT,
+    owners TEXT,
+    primary_url TEXT,
+    department TEXT,
+    notes TEXT,
+    pope_tech BOOLEAN DEFAULT FALSE,
+    errors INTEGER,
+    active BOOLEAN DEFAULT TRUE,
+    cms TEXT
+);
+
+CREATE TABLE IF NOT EXISTS public.wedac_contacts (
+    id SERIAL PRIMARY KEY,
+    department TEXT,
+    name TEXT,
+    email TEXT,
+    site TEXT
+);
+
+CREATE TABLE IF NOT EXISTS public.users (
+    id SERIAL PRIMARY KEY,
+    username TEXT UNIQUE NOT NULL,
+    password_hash TEXT NOT NULL,
+    role TEXT
+);
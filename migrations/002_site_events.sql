@@ -0,0 +1,21 @@
+-- Append-only move/edit audit log that replaces the "Moved from X on DATE"
+-- text /move and /move-all used to append to notes.
+CREATE TABLE IF NOT EXISTS public.site_events (
+    id BIGSERIAL PRIMARY KEY,
+    site_id INTEGER NOT NULL,
+    event_type TEXT NOT NULL, -- 'move' or 'update'
+    department TEXT, -- department the site was in when the event happened
+    target_department TEXT, -- destination of a move
+    changes JSONB, -- column -> new value for updates
+    username TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- History lookups are always "newest first" for one site or one department
+CREATE INDEX IF NOT EXISTS site_events_site_idx
+    ON public.site_events (site_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS site_events_department_idx
+    ON public.site_events (department, created_at DESC);
+CREATE INDEX IF NOT EXISTS site_events_target_department_idx
+    ON public.site_events (target_department, created_at DESC)
+    WHERE target_department IS NOT NULL;
@@ -0,0 +1,44 @@
+-- Indexes matching the filters the app and batch jobs run against
+-- drupal_sites_by_department and wedac_contacts. check_query_plans.py
+-- fails if any of those queries stops using them.
+
+-- /update, /delete and /move look rows up by id. Production tables were not
+-- created by these migrations, so only add a unique index if id has none.
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1
+        FROM pg_index i
+        JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+        WHERE i.indrelid = 'public.drupal_sites_by_department'::regclass
+          AND i.indnatts = 1
+          AND a.attname = 'id'
+    ) THEN
+        CREATE UNIQUE INDEX drupal_sites_by_department_id_idx
+            ON public.drupal_sites_by_department (id);
+    END IF;
+END
+$$;
+
+-- Per-department page query built in populate() (WHERE department = ... ORDER BY id)
+-- and the Google Sites export in wedacs_list()
+CREATE INDEX IF NOT EXISTS drupal_sites_department_id_idx
+    ON public.drupal_sites_by_department (department, id);
+
+-- wedacs_list() Pope Tech / active splits for each department
+CREATE INDEX IF NOT EXISTS drupal_sites_department_flags_idx
+    ON public.drupal_sites_by_department (department, pope_tech, active);
+
+-- update_pope_tech_from_csv() matches Pope Tech's export by primary_url
+CREATE INDEX IF NOT EXISTS drupal_sites_primary_url_idx
+    ON public.drupal_sites_by_department (primary_url);
+
+-- mark_inactive_sites() only checks sites not yet in Pope Tech. The index stays
+-- small as sites are onboarded and lets the planner skip onboarded rows entirely.
+CREATE INDEX IF NOT EXISTS drupal_sites_not_in_pope_tech_idx
+    ON public.drupal_sites_by_department (id)
+    WHERE pope_tech = FALSE AND primary_url IS NOT NULL;
+
+-- wedacs_list() contact export per department
+CREATE INDEX IF NOT EXISTS wedac_contacts_department_idx
+    ON public.wedac_contacts (department);
@@ -0,0 +1,19 @@
+-- Latest liveness result for every URL of a site (primary_url and each alias),
+-- written by mark_inactive_sites(). A site's active flag is rolled up from
+-- these rows, so this table shows which of its URLs is the one that broke.
+CREATE TABLE IF NOT EXISTS public.site_url_checks (
+    site_id INTEGER NOT NULL,
+    url TEXT NOT NULL, -- normalized, e.g. http://site.dev.umn.edu
+    kind TEXT NOT NULL, -- 'primary' or 'alias'
+    is_up BOOLEAN NOT NULL,
+    status_code INTEGER, -- final status after redirects; NULL if no response
+    error TEXT, -- exception name when there was no response
+    elapsed_ms INTEGER,
+    checked_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (site_id, url)
+);
+
+-- "Which sites have a broken alias" reports
+CREATE INDEX IF NOT EXISTS site_url_checks_down_idx
+    ON public.site_url_checks (site_id)
+    WHERE NOT is_up;
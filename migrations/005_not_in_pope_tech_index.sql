@@ -0,0 +1,13 @@
+-- mark_inactive_sites() now selects sites not in Pope Tech that have a primary_url
+-- OR aliases. The 003 partial index also required primary_url IS NOT NULL, which
+-- that query does not imply, so the planner could no longer use it. Rebuild it on
+-- pope_tech = FALSE alone.
+DROP INDEX IF EXISTS public.drupal_sites_not_in_pope_tech_idx;
+CREATE INDEX IF NOT EXISTS drupal_sites_not_in_pope_tech_idx
+    ON public.drupal_sites_by_department (id)
+    WHERE pope_tech = FALSE;
+
+-- site_url_checks.kind is now 'primary', 'alias' (another production host) or
+-- 'environment' (a dev/stg host such as site.dev.umn.edu). Only primary and
+-- alias URLs decide whether a site is active; mark_inactive_sites() reports
+-- broken aliases and environments separately.
@@ -0,0 +1,25 @@
+-- Explicit row version for the edit form's optimistic concurrency check, in
+-- place of xmin. xmin is a property of one physical copy of the row: it only
+-- matches between the primary and a replica on a physical streaming standby.
+-- row_version is ordinary data, so it reads the same from any replica the
+-- index page is loaded from.
+--
+-- A constant default makes ADD COLUMN a metadata-only change, so existing rows
+-- are not rewritten.
+ALTER TABLE public.drupal_sites_by_department
+    ADD COLUMN IF NOT EXISTS row_version BIGINT NOT NULL DEFAULT 1;
+
+-- Every UPDATE bumps it, whichever code path writes: routes, batch jobs and
+-- manual fixes alike, as xmin did. On a logical replica the trigger does not
+-- fire, and the bumped value is replicated instead.
+CREATE OR REPLACE FUNCTION public.bump_row_version() RETURNS trigger AS $$
+BEGIN
+    NEW.row_version := OLD.row_version + 1;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS drupal_sites_bump_row_version ON public.drupal_sites_by_department;
+CREATE TRIGGER drupal_sites_bump_row_version
+    BEFORE UPDATE ON public.drupal_sites_by_department
+    FOR EACH ROW EXECUTE FUNCTION public.bump_row_version();
@@ -0,0 +1,109 @@
+"""
+Seed a local PostgreSQL database with a synthetic sites catalogue
+(departments x sites x contacts) for query plan checks and benchmarks.
+
+Seeding TRUNCATEs drupal_sites_by_department, wedac_contacts, site_events and
+site_url_checks, so the target database must be passed explicitly; DATABASE_URL
+is never used.
+
+Usage:
+    python seed.py postgresql://postgres@localhost/sites_test --departments 60 --sites 500
+"""
+import argparse
+
+import psycopg2
+
+from migrate import run_migrations
+
+# Share of sites in each state, roughly matching the real catalogue
+# (see WEDACS/*/site_counter.txt)
+POPE_TECH_RATIO = 0.4
+ACTIVE_RATIO = 0.8
+CMS_VALUES = ['Drupal', 'Drupal', 'Drupal', 'Google Sites', 'WordPress', 'Other']
+
+def department_name(index):
+    """Synthetic department title. The first word is unique, as populate() builds ids from it"""
+    return f'D{index:03d} - Synthetic Department {index}'
+
+def seed_catalogue(dsn, departments=60, sites_per_department=500, contacts_per_department=3,
+                   pope_tech_ratio=POPE_TECH_RATIO, active_ratio=ACTIVE_RATIO, seed=0.42):
+    """
+    Replace the catalogue in a local database with synthetic rows and ANALYZE it.
+
+    Args:
+        dsn (str): Connection string of the local database to seed
+        departments (int): Number of departments
+        sites_per_department (int): Sites in each department
+        contacts_per_department (int): WEDAC contacts in each department
+        pope_tech_ratio (float): Share of sites with pope_tech = TRUE
+        active_ratio (float): Share of sites with active = TRUE
+        seed (float): setseed() value so repeated runs produce the same catalogue
+    """
+    run_migrations(dsn) # make sure tables and indexes exist
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    cur.execute('TRUNCATE public.drupal_sites_by_department, public.wedac_contacts, public.site_events, public.site_url_checks')
+    cur.execute('SELECT setseed(%s)', (seed,))
+    cur.execute('''
+        INSERT INTO public.drupal_sites_by_department
+            (id, title, environments, aliases, owners, primary_url, department, notes, pope_tech, errors, active, cms)
+        SELECT
+            n,
+            'Synthetic Site ' || n,
+            (ARRAY['prod', 'test, prod', 'dev, test, prod'])[1 + n %% 3],
+            'site' || n || '.dev.example.edu, site' || n || '.stg.example.edu',
+            'owner' || n %% 997,
+            'site' || n || '.example.edu',
+            'D' || lpad(((n - 1) / %(sites)s + 1)::text, 3, '0') || ' - Synthetic Department ' || ((n - 1) / %(sites)s + 1),
+            CASE WHEN n %% 10 = 0 THEN 'Synthetic note ' || n END,
+            random() < %(pope_tech)s,
+            CASE WHEN n %% 4 = 0 THEN (n %% 50)::int END,
+            random() < %(active)s,
+            (%(cms)s::text[])[1 + n %% %(cms_count)s]
+        FROM generate_series(1, %(total)s) AS n
+    ''', {
+        'sites': sites_per_department,
+        'total': departments * sites_per_department,
+        'pope_tech': pope_tech_ratio,
+        'active': active_ratio,
+        'cms': CMS_VALUES,
+        'cms_count': len(CMS_VALUES),
+    })
+    cur.execute('''
+        INSERT INTO public.wedac_contacts (department, name, email, site)
+        SELECT
+            'D' || lpad(d::text, 3, '0') || ' - Synthetic Department ' || d,
+            'Contact ' || d || '-' || c,
+            'contact' || d || '-' || c || '@example.edu',
+            CASE WHEN c = 1 THEN 'site' || ((d - 1) * %(sites)s + 1) || '.example.edu' END
+        FROM generate_series(1, %(departments)s) AS d, generate_series(1, %(contacts)s) AS c
+    ''', {'sites': sites_per_department, 'departments': departments, 'contacts': contacts_per_department})
+    # Two edits per site so history queries run against a realistically sized audit table
+    cur.execute('''
+        INSERT INTO public.site_events (site_id, event_type, department, changes, username, created_at)
+        SELECT id, 'update', department, jsonb_build_object('notes', 'edit ' || e), 'seed',
+               now() - (e || ' days')::interval
+        FROM public.drupal_sites_by_department, generate_series(1, 2) AS e
+    ''')
+    conn.commit()
+
+    # Fresh statistics so EXPLAIN and benchmarks see the plans production would
+    conn.autocommit = True
+    cur.execute('ANALYZE public.drupal_sites_by_department')
+    cur.execute('ANALYZE public.wedac_contacts')
+    cur.execute('ANALYZE public.site_events')
+    cur.close()
+    conn.close()
+    print(f"Seeded {departments} departments x {sites_per_department} sites x {contacts_per_department} contacts")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('dsn', help='connection string of a LOCAL database; its catalogue is replaced')
+    parser.add_argument('--departments', type=int, default=60)
+    parser.add_argument('--sites', type=int, default=500, help='sites per department')
+    parser.add_argument('--contacts', type=int, default=3, help='contacts per department')
+    parser.add_argument('--pope-tech-ratio', type=float, default=POPE_TECH_RATIO)
+    parser.add_argument('--active-ratio', type=float, default=ACTIVE_RATIO)
+    args = parser.parse_args()
+    seed_catalogue(args.dsn, args.departments, args.sites, args.contacts,
+                   args.pope_tech_ratio, args.active_ratio)
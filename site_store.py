@@ -0,0 +1,297 @@
+"""
+Compact in-memory store for drupal_sites_by_department rows.
+
+A psycopg2 DictRow (or the dict wedacs_list used to build from it) costs
+hundreds of bytes of object overhead per row before counting its values, and
+strings like cms, department and environments are repeated on every row.
+SiteStore keeps a result set as columns instead:
+
+    categorical  department, cms, environments: one 2 byte code per row plus
+                 a table of the distinct values, so each string exists once
+    flags        pope_tech, active: two bits per row (value and NULL) packed
+                 into bytearrays
+    integers     id, errors, row_version: an array of 8 byte ints plus a NULL bitmap
+    text         title, aliases, owners, primary_url, notes:
+                 every value concatenated into one str, sliced by an offsets array
+    other        any other column is kept as a plain list
+
+Rows come back as plain tuples in the query's column order, so templates that
+index rows by position work unchanged, and select() filters by department,
+cms and flags without building any rows. `python benchmark.py memory <dsn>`
+compares its size with DictCursor rows.
+"""
+import itertools
+from array import array
+
+CATEGORICAL_COLUMNS = {'department', 'cms', 'environments'}
+FLAG_COLUMNS = {'pope_tech', 'active'}
+INTEGER_COLUMNS = {'id', 'errors', 'row_version'}
+TEXT_COLUMNS = {'title', 'aliases', 'owners', 'primary_url', 'notes'}
+
+ZERO_ONE = bytes.maketrans(b'\x00\x01', b'01')
+
+def bits_at(bits, indices):
+    """0/1 for each row number in indices"""
+    return [bits[i >> 3] >> (i & 7) & 1 for i in indices]
+
+def grow_bits(bits, length):
+    """Pad a bitmap with zero bytes until it holds length rows"""
+    bits.extend(bytes((length + 7) // 8 - len(bits)))
+
+def append_bits(bits, start, flags):
+    """
+    Pack one bit per flag onto the end of a bitmap, bit start + n holding bool(flags[n]).
+    Rows from start on must not have been written yet.
+    """
+    # b'0'/b'1' per flag, reversed, parses as an int whose bit n is flag n, all in C
+    if not flags:
+        return
+    digits = bytes(map(bool, flags)).translate(ZERO_ONE)[::-1]
+    shift = start & 7
+    packed = (int(digits, 2) << shift).to_bytes((shift + len(flags) + 7) // 8, 'little')
+    first = start >> 3
+    grow_bits(bits, start + len(flags))
+    bits[first] |= packed[0] # may share a byte with earlier rows
+    bits[first + 1:first + len(packed)] = packed[1:]
+
+def full_range(indices, length):
+    """True if indices asks for every row in order, so columns can be read without per-row lookups"""
+    return isinstance(indices, range) and indices == range(length)
+
+class CategoricalColumn:
+    """Interned strings: a code per row indexing the table of distinct values"""
+    __slots__ = ('values', 'codes', 'lookup', 'rows_by_code')
+
+    def __init__(self):
+        self.values = []
+        self.codes = array('H')
+        self.lookup = {} # value -> code
+        self.rows_by_code = None # code -> array of row numbers, built on first select()
+
+    def append_values(self, start, values):
+        lookup = self.lookup
+        for value in dict.fromkeys(values): # distinct values, in order of first appearance
+            if value not in lookup:
+                lookup[value] = len(self.values)
+                self.values.append(value)
+        if len(self.values) > 1 << 16 and self.codes.typecode == 'H':
+            self.codes = array('I', self.codes) # more distinct values than 2 byte codes hold
+        self.codes.extend(map(lookup.__getitem__, values))
+        self.rows_by_code = None # rebuilt on the next select()
+
+    def take(self, indices):
+        values, codes = self.values, self.codes
+        if full_range(indices, len(codes)):
+            return list(map(values.__getitem__, codes))
+        return [values[codes[i]] for i in indices]
+
+    def rows_equal_to(self, value):
+        """Row numbers holding value, in store order"""
+        if self.rows_by_code is None:
+            # Built in full before it is published, in case the store is shared between threads
+            rows_by_code = [array('I') for _ in self.values]
+            for i, code in enumerate(self.codes):
+                rows_by_code[code].append(i)
+            self.rows_by_code = rows_by_code
+        code = self.lookup.get(value)
+        return self.rows_by_code[code] if code is not None else array('I')
+
+class NullableColumn:
+    """Base for columns that record NULLs in a bitmap"""
+    __slots__ = ('null_bits', 'has_nulls')
+
+    def __init__(self):
+        self.null_bits = bytearray()
+        self.has_nulls = False
+
+    def append_nulls(self, start, values):
+        """Record which values are None; returns True if any are"""
+        nulls = None in values
+        if nulls:
+            append_bits(self.null_bits, start, [value is None for value in values])
+        else:
+            grow_bits(self.null_bits, start + len(values))
+        self.has_nulls = self.has_nulls or nulls
+        return nulls
+
+    def with_nulls(self, values, indices):
+        """Replace the values of NULL rows with None"""
+        if not self.has_nulls:
+            return values
+        return [None if null else value for value, null in zip(values, bits_at(self.null_bits, indices))]
+
+class FlagColumn(NullableColumn):
+    """Nullable booleans, one bit for the value and one for NULL per row"""
+    __slots__ = ('true_bits',)
+
+    def __init__(self):
+        super().__init__()
+        self.true_bits = bytearray()
+
+    def append_values(self, start, values):
+        self.append_nulls(start, values)
+        append_bits(self.true_bits, start, values)
+
+    def take(self, indices):
+        return self.with_nulls(list(map(bool, bits_at(self.true_bits, indices))), indices)
+
+class IntegerColumn(NullableColumn):
+    """Nullable integers in an array with a NULL bitmap"""
+    __slots__ = ('values',)
+
+    def __init__(self):
+        super().__init__()
+        self.values = array('q')
+
+    def append_values(self, start, values):
+        if self.append_nulls(start, values):
+            values = [0 if value is None else value for value in values]
+        self.values.extend(values)
+
+    def take(self, indices):
+        values = self.values
+        if full_range(indices, len(values)):
+            return self.with_nulls(values.tolist(), indices)
+        return self.with_nulls([values[i] for i in indices], indices)
+
+class TextColumn(NullableColumn):
+    """Nullable strings joined into one str; row i is text[offsets[i]:offsets[i + 1]]"""
+    __slots__ = ('text', 'offsets', 'parts')
+
+    def __init__(self):
+        super().__init__()
+        self.text = ''
+        self.offsets = array('I', [0])
+        self.parts = [] # values appended since the last join
+
+    def append_values(self, start, values):
+        if self.append_nulls(start, values):
+            values = ['' if value is None else value for value in values]
+        self.parts.extend(values)
+        ends = itertools.accumulate(map(len, values), initial=self.offsets[-1])
+        self.offsets.extend(itertools.islice(ends, 1, None))
+
+    def finish(self):
+        self.text += ''.join(self.parts)
+        self.parts = []
+
+    def take(self, indices):
+        offsets = self.offsets
+        if full_range(indices, len(offsets) - 1):
+            starts, ends = offsets[:-1], offsets[1:]
+        else:
+            starts = [offsets[i] for i in indices]
+            ends = [offsets[i + 1] for i in indices]
+        return self.with_nulls(list(map(self.text.__getitem__, map(slice, starts, ends))), indices)
+
+class ListColumn(list):
+    """Fallback for columns with no compact representation"""
+    __slots__ = ()
+
+    def append_values(self, start, values):
+        list.extend(self, values)
+
+    def take(self, indices):
+        return [self[i] for i in indices]
+
+class SiteStore:
+    """
+    Columnar copy of a drupal_sites_by_department result set.
+
+    Args:
+        columns (list): Column names in query order
+    """
+    __slots__ = ('columns', 'column_data', 'length')
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self.column_data = []
+        for name in self.columns:
+            if name in CATEGORICAL_COLUMNS:
+                self.column_data.append(CategoricalColumn())
+            elif name in FLAG_COLUMNS:
+                self.column_data.append(FlagColumn())
+            elif name in INTEGER_COLUMNS:
+                self.column_data.append(IntegerColumn())
+            elif name in TEXT_COLUMNS:
+                self.column_data.append(TextColumn())
+            else:
+                self.column_data.append(ListColumn())
+        self.length = 0
+
+    @classmethod
+    def from_cursor(cls, cur, batch_size=2000):
+        """Build a store from an executed cursor, fetching batch_size rows at a time"""
+        store = cls(desc[0] for desc in cur.description)
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            store.append_rows(rows)
+        store.finish()
+        return store
+
+    def extend(self, rows):
+        """Append rows given as sequences in column order"""
+        self.append_rows(rows)
+        self.finish()
+
+    def append_rows(self, rows):
+        """Append rows without finishing; from_cursor() uses this to join text only once"""
+        if not rows:
+            return
+        # Column at a time, so each column type handles a whole batch in one call
+        for column, values in zip(self.column_data, zip(*rows)):
+            column.append_values(self.length, values)
+        self.length += len(rows)
+
+    def finish(self):
+        """Join text appended since the last call"""
+        for column in self.column_data:
+            if isinstance(column, TextColumn):
+                column.finish()
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        return iter(self.rows(range(self.length)))
+
+    def rows(self, indices):
+        """Tuples in column order for the given row numbers, e.g. the result of select()"""
+        return list(zip(*[column.take(indices) for column in self.column_data]))
+
+    def column(self, name):
+        return self.column_data[self.columns.index(name)]
+
+    def select(self, **filters):
+        """
+        Return the row numbers whose columns equal every filter, in store order.
+        Only categorical and flag columns can be filtered on.
+
+        Example:
+            store.select(department='CSE - College of Science & Engineering', pope_tech=False, active=True)
+        """
+        categorical = []
+        flags = []
+        for name, value in filters.items():
+            column = self.column(name)
+            if isinstance(column, CategoricalColumn):
+                categorical.append((column, value))
+            elif isinstance(column, FlagColumn):
+                flags.append((column, value))
+            else:
+                raise ValueError(f"{name} is not a categorical or flag column")
+
+        # Start from the fewest candidate rows, then check the remaining filters per row
+        if categorical:
+            candidates = [column.rows_equal_to(value) for column, value in categorical]
+            candidates.sort(key=len)
+            rows = candidates[0]
+            remaining = [set(other) for other in candidates[1:]]
+            rows = [i for i in rows if all(i in other for other in remaining)]
+        else:
+            rows = range(self.length)
+        for column, value in flags:
+            rows = [i for i, flag in zip(rows, column.take(rows)) if flag == value]
+        return list(rows)
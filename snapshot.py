@@ -0,0 +1,202 @@
+"""
+Parquet snapshots of the sites database for downstream reporting.
+
+Each run writes the current contents of drupal_sites_by_department,
+wedac_contacts and, if migrations have created it, the per-URL check history
+in site_url_checks, as one dated snapshot per table:
+
+    snapshots/<table>/snapshot_date=2026-01-31/part-0.parquet
+
+Rows are streamed from a server-side cursor in record batches, so memory stays
+flat however large the catalogue is. Within a file rows are ordered by
+department, so each department's rows are stored together and, once a table
+spans several row groups, a filter on department skips the row groups of other
+departments. Re-running a day replaces that day's file. Reports then read the snapshots instead of the database or the
+CSVs wedacs_list writes, e.g. a year of them with load_snapshot():
+
+    sites = load_snapshot('snapshots', 'drupal_sites_by_department', since='2026-01-01')
+
+The export reads DATABASE_READ_URL when it is set, so it never queries the primary.
+Requires the optional pyarrow package: pip install pyarrow
+
+Usage:
+    python snapshot.py                               # today's snapshot into ./snapshots
+    python snapshot.py --output /data/snapshots --date 2026-01-31
+"""
+import argparse
+import datetime
+import json
+import os
+
+import psycopg2
+
+BATCH_SIZE = 10000 # rows per record batch fetched from the server-side cursor
+ROW_GROUP_SIZE = 100000 # rows per Parquet row group; small row groups make reading a year of snapshots slow
+
+# table -> query. Every query returns a department column and is ordered by it,
+# so each department's rows reach the writer together.
+SNAPSHOT_TABLES = {
+    'drupal_sites_by_department': 'SELECT * FROM public.drupal_sites_by_department ORDER BY department, id',
+    'wedac_contacts': 'SELECT * FROM public.wedac_contacts ORDER BY department, id',
+    # Check history has no department of its own; take the site's current one
+    'site_url_checks': '''
+        SELECT checks.*, sites.department
+        FROM public.site_url_checks AS checks
+        LEFT JOIN public.drupal_sites_by_department AS sites ON sites.id = checks.site_id
+        ORDER BY sites.department, checks.site_id, checks.url
+    ''',
+}
+# Tables that may not exist yet in every database
+OPTIONAL_TABLES = {'site_url_checks'}
+
+def import_pyarrow():
+    """Import pyarrow, pyarrow.dataset and pyarrow.parquet, which are only needed for snapshots"""
+    try:
+        import pyarrow # Optional dependency, only needed for snapshots
+        import pyarrow.dataset
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Parquet snapshots require the 'pyarrow' package: pip install pyarrow")
+    return pyarrow, pyarrow.dataset, pyarrow.parquet
+
+def arrow_type(pa, type_code):
+    """Arrow type for a PostgreSQL type oid from cursor.description; anything unlisted is stored as text"""
+    return {
+        16: pa.bool_(), # boolean
+        20: pa.int64(), # bigint
+        21: pa.int16(), # smallint
+        23: pa.int32(), # integer
+        700: pa.float32(), # real
+        701: pa.float64(), # double precision
+        1082: pa.date32(), # date
+        1114: pa.timestamp('us'), # timestamp
+        1184: pa.timestamp('us', tz='UTC'), # timestamptz
+    }.get(type_code, pa.string())
+
+def to_text(value):
+    """Text form of a value from a column without a matching arrow type (jsonb, numeric, ...)"""
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (dict, list)):
+        return json.dumps(value) # jsonb
+    return str(value)
+
+def table_exists(cur, table):
+    cur.execute('SELECT to_regclass(%s) IS NOT NULL', (f'public.{table}',))
+    return cur.fetchone()[0]
+
+def record_batches(pa, cur, batch_size):
+    """
+    Stream an executed server-side cursor as arrow record batches.
+
+    Returns:
+        (schema, iterator of RecordBatch), or (None, None) if the query returned no rows
+    """
+    rows = cur.fetchmany(batch_size) # a named cursor only has a description after its first fetch
+    if not rows:
+        return None, None
+    schema = pa.schema([pa.field(desc[0], arrow_type(pa, desc[1])) for desc in cur.description])
+    text_columns = [n for n, field in enumerate(schema) if field.type == pa.string()]
+
+    def batches(rows):
+        while rows:
+            columns = [list(column) for column in zip(*rows)]
+            for n in text_columns:
+                columns[n] = [to_text(value) for value in columns[n]]
+            yield pa.record_batch(columns, schema=schema)
+            rows = cur.fetchmany(batch_size)
+    return schema, batches(rows)
+
+def export_snapshot(output_dir='snapshots', snapshot_date=None, dsn=None, batch_size=BATCH_SIZE):
+    """
+    Write one dated Parquet snapshot of every table in SNAPSHOT_TABLES.
+
+    Args:
+        output_dir (str): Root folder of the snapshot datasets, one subfolder per table
+        snapshot_date (datetime.date): Date to file the snapshot under; defaults to today
+        dsn (str): Database to read; defaults to DATABASE_READ_URL, then DATABASE_URL
+        batch_size (int): Rows per record batch
+    """
+    pa, ds, pq = import_pyarrow()
+    snapshot_date = snapshot_date or datetime.date.today()
+    dsn = dsn or os.environ.get('DATABASE_READ_URL') or os.environ.get('DATABASE_URL')
+
+    conn = psycopg2.connect(dsn)
+    # One read-only transaction, so every table is read from the same point in time
+    conn.set_session(readonly=True, isolation_level='REPEATABLE READ')
+    cur = conn.cursor()
+    try:
+        for table, query in SNAPSHOT_TABLES.items():
+            if table in OPTIONAL_TABLES and not table_exists(cur, table):
+                print(f"{table} does not exist, skipped")
+                continue
+            stream = conn.cursor(name=f'snapshot_{table}') # server-side, rows arrive batch_size at a time
+            stream.itersize = batch_size
+            stream.execute(query)
+            schema, batches = record_batches(pa, stream, batch_size)
+            if schema is None:
+                print(f"{table}: no rows")
+                stream.close()
+                continue
+
+            # One file per day rather than a folder per department: a department's
+            # daily rows number in the tens, and reading a year of snapshots is
+            # dominated by per-file and per-row-group overhead, not by data
+            folder = os.path.join(output_dir, table, f'snapshot_date={snapshot_date.isoformat()}')
+            os.makedirs(folder, exist_ok=True)
+            path = os.path.join(folder, 'part-0.parquet')
+            temp_path = os.path.join(folder, '_part-0.parquet.tmp') # datasets skip names starting with _
+            rows = 0
+            with pq.ParquetWriter(temp_path, schema) as writer:
+                pending = [] # batches for the next row group
+                for batch in batches:
+                    pending.append(batch)
+                    rows += batch.num_rows
+                    if sum(b.num_rows for b in pending) >= ROW_GROUP_SIZE:
+                        writer.write_table(pa.Table.from_batches(pending), ROW_GROUP_SIZE)
+                        pending = []
+                if pending:
+                    writer.write_table(pa.Table.from_batches(pending), ROW_GROUP_SIZE)
+            os.replace(temp_path, path) # readers never see a half written snapshot
+            stream.close()
+            print(f"{table}: {rows} rows written to snapshot {snapshot_date}")
+    finally:
+        cur.close()
+        conn.close()
+
+def load_snapshot(output_dir, table, since=None, until=None, departments=None, columns=None):
+    """
+    Read snapshots of one table back into a pyarrow Table, reading only the
+    files and row groups that match the filters.
+
+    Args:
+        output_dir (str): Root folder passed to export_snapshot()
+        table (str): One of SNAPSHOT_TABLES
+        since (str or datetime.date): First snapshot date to include
+        until (str or datetime.date): Last snapshot date to include
+        departments (list): Only these departments
+        columns (list): Only these columns
+    """
+    pa, ds, _ = import_pyarrow()
+    partitioning = ds.partitioning(pa.schema([('snapshot_date', pa.date32())]), flavor='hive')
+    dataset = ds.dataset(os.path.join(output_dir, table), format='parquet', partitioning=partitioning)
+    conditions = []
+    if since:
+        conditions.append(ds.field('snapshot_date') >= pa.scalar(datetime.date.fromisoformat(str(since))))
+    if until:
+        conditions.append(ds.field('snapshot_date') <= pa.scalar(datetime.date.fromisoformat(str(until))))
+    if departments:
+        conditions.append(ds.field('department').isin(departments))
+    condition = None
+    for expression in conditions:
+        condition = expression if condition is None else condition & expression
+    return dataset.to_table(columns=columns, filter=condition)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write a dated Parquet snapshot of the sites database')
+    parser.add_argument('--output', default='snapshots', help='root folder of the snapshot datasets')
+    parser.add_argument('--date', type=datetime.date.fromisoformat, help='snapshot date, YYYY-MM-DD (default today)')
+    parser.add_argument('--dsn', help='database to read (default DATABASE_READ_URL, then DATABASE_URL)')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='rows per record batch')
+    args = parser.parse_args()
+    export_snapshot(args.output, args.date, args.dsn, args.batch_size)
@@ -1266,10 +1266,11 @@ document.addEventListener("DOMContentLoaded", () => {
 });
 
 // Edit Modal functionality
-function openEditModal(id, tableName, title, environments, aliases, owners, primaryUrl, notes, popeTech, errors, active, cms) {
+function openEditModal(id, tableName, title, environments, aliases, owners, primaryUrl, notes, popeTech, errors, active, cms, rowVersion) {
   // Set the form values in the modal
   document.getElementById("edit-id-value").value = id;
   document.getElementById("edit-table-name").value = tableName;
+  document.getElementById("edit-row-version").value = rowVersion || ""; // checked by /update to reject conflicting edits
   // Set the values for all input fields
   document.getElementById("edit-title").value = title;
   document.getElementById("edit-environments").value = environments;
@@ -1277,9 +1278,10 @@ function openEditModal(id, tableName, title, environments, aliases, owners, prim
   document.getElementById("edit-owners").value = owners;
   document.getElementById("edit-primary-url").value = primaryUrl;
   document.getElementById("edit-notes").value = notes;
-  document.getElementById("edit-pope-tech").value = popeTech;
+  // Rows render booleans as "True"/"False"; the select options are lowercase
+  document.getElementById("edit-pope-tech").value = String(popeTech).toLowerCase();
   document.getElementById("edit-errors").value = errors;
-  document.getElementById("edit-active").value = active;
+  document.getElementById("edit-active").value = String(active).toLowerCase();
   document.getElementById("edit-cms").value = cms;
 
   // Set the modal title with the item name